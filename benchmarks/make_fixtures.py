@@ -0,0 +1,209 @@
+"""Write the fixtures of the benchmark suite, which are committed to the repo.
+
+Usage:
+    python benchmarks/make_fixtures.py
+
+Everything is generated deterministically, without network access:
+
+- fixtures/arxiv/<id>.tar.gz, <id>.gz: arXiv e-prints, i.e. gzipped tarballs
+  of LaTeX sources with PDF/PNG figures and files which are not needed to
+  render the paper, and a paper of a single gzipped .tex file
+- fixtures/notion/<page>.json: Notion blocks of fixtures/pages/<page>.html as
+  converted by html_to_notion, whose remote images are already on gyazo, and
+  whose local images are next to them
+"""
+import gzip
+import io
+import json
+import random
+import struct
+import sys
+import tarfile
+import zlib
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from lib import html_to_notion  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parents[1] / "fixtures"
+
+
+def make_png(width: int, height: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    color = [rng.randrange(256) for _ in range(3)]
+    rows = b"".join(
+        b"\x00"
+        + bytes(
+            (color[c] + x * 3 + y * 2) % 256 for x in range(width) for c in range(3)
+        )
+        for y in range(height)
+    )
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + kind
+            + data
+            + struct.pack(">I", zlib.crc32(kind + data))
+        )
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(rows, 9))
+        + chunk(b"IEND", b"")
+    )
+
+
+def make_pdf(seed: int, shapes: int = 200) -> bytes:
+    """A single-page vector figure, like a plot exported by matplotlib."""
+    rng = random.Random(seed)
+    ops = ["0.5 w"]
+    for _ in range(shapes):
+        r, g, b = (rng.random() for _ in range(3))
+        x, y = rng.uniform(0, 400), rng.uniform(0, 300)
+        w, h = rng.uniform(5, 60), rng.uniform(5, 60)
+        ops.append(f"{r:.3f} {g:.3f} {b:.3f} rg {x:.1f} {y:.1f} {w:.1f} {h:.1f} re f")
+    ops.append("BT /F1 12 Tf 20 280 Td (Figure) Tj ET")
+    content = "\n".join(ops).encode()
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 480 320] "
+        b"/Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf, offsets = b"%PDF-1.4\n", []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\n" % (len(objects) + 1)
+    pdf += b"startxref\n%d\n%%%%EOF\n" % xref
+    return pdf
+
+
+def make_tex(title: str, figures: list[str], sections: int = 8) -> bytes:
+    rng = random.Random(title)
+    words = (
+        "diffusion model transformer attention image text generation training "
+        "dataset sample loss gradient layer embedding token benchmark result"
+    ).split()
+    lines = [
+        r"\documentclass{article}",
+        r"\usepackage{graphicx}",
+        r"\usepackage{neurips}",
+        rf"\title{{{title}}}",
+        r"\begin{document}",
+        r"\maketitle",
+    ]
+    for i in range(sections):
+        lines.append(rf"\section{{Section {i + 1}}}")
+        for _ in range(6):
+            lines.append(" ".join(rng.choice(words) for _ in range(80)) + ".")
+        if i < len(figures):
+            lines += [
+                r"\begin{figure}[t]",
+                rf"\includegraphics[width=\linewidth]{{{figures[i]}}}",
+                rf"\caption{{Figure {i + 1} of {title}.}}",
+                r"\end{figure}",
+            ]
+    lines += [r"\bibliography{refs}", r"\end{document}"]
+    return "\n".join(lines).encode()
+
+
+def make_tarball(path: Path, members: dict[str, bytes]) -> None:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w", format=tarfile.USTAR_FORMAT) as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size, info.mtime, info.mode = len(data), 0, 0o644
+            tar.addfile(info, io.BytesIO(data))
+    write_gzip(path, buffer.getvalue())
+
+
+def write_gzip(path: Path, data: bytes) -> None:
+    with open(path, "wb") as f, gzip.GzipFile(
+        fileobj=f, mode="wb", mtime=0, filename=""
+    ) as gz:
+        gz.write(data)
+
+
+def make_arxiv() -> None:
+    root = FIXTURES / "arxiv"
+    root.mkdir(parents=True, exist_ok=True)
+    bib = "\n".join(
+        f"@article{{ref{i}, title={{Reference {i}}}, year={{20{i % 24:02d}}}}}"
+        for i in range(100)
+    ).encode()
+
+    # a typical paper: a few figures, and files which are not extracted
+    figures = ["figures/overview.pdf", "figures/results.pdf", "figures/samples.png"]
+    make_tarball(
+        root / "2301.00001.tar.gz",
+        {
+            "main.tex": make_tex("A Typical Paper", figures),
+            "refs.bib": bib,
+            "neurips.sty": b"\\ProvidesPackage{neurips}\n" * 50,
+            "main.aux": b"\\relax\n" * 500,
+            "main.log": b"This is pdfTeX\n" * 2000,
+            "anc/data.csv": "\n".join(
+                f"{i},{i * 0.1:.3f},{i % 7}" for i in range(20000)
+            ).encode(),
+            "figures/overview.pdf": make_pdf(1),
+            "figures/results.pdf": make_pdf(2),
+            "figures/samples.png": make_png(256, 192, 3),
+        },
+    )
+
+    # a paper with many PDF figures, for the rasterization
+    figures = [f"figures/fig{i:02d}.pdf" for i in range(16)]
+    make_tarball(
+        root / "2301.00002.tar.gz",
+        {
+            "paper.tex": make_tex("A Paper With Many Figures", figures, sections=16),
+            "refs.bib": bib,
+            **{figure: make_pdf(10 + i) for i, figure in enumerate(figures)},
+        },
+    )
+
+    # a paper of a single .tex file is gzipped but not tarred
+    write_gzip(root / "2301.00003.gz", make_tex("A Single File Paper", []))
+
+
+def make_notion() -> None:
+    root = FIXTURES / "notion"
+    root.mkdir(parents=True, exist_ok=True)
+    for page in sorted((FIXTURES / "pages").glob("*.html")):
+        blocks = list(html_to_notion(page.read_text()))
+        for block in blocks:
+            if block["type"] != "image":
+                continue
+            image = block["image"]["external"]
+            if image["url"].startswith(("http", "/")):
+                # remote images are on gyazo already
+                image["url"] = "https://i.gyazo.com/" + (
+                    f"{zlib.crc32(image['url'].encode()):08x}.png"
+                )
+            else:
+                # local images of engrafo are next to the blocks
+                path = root / image["url"]
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(make_png(320, 240, zlib.crc32(image["url"].encode())))
+        (root / f"{page.stem}.json").write_text(
+            json.dumps(blocks, ensure_ascii=False, indent=1) + "\n"
+        )
+
+
+def main():
+    make_arxiv()
+    make_notion()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""Offline benchmark suite of the stages of the pipeline.
+
+Usage:
+    python benchmarks/run.py run [--only NAME ...] [--repeat 20] [--output FILE]
+    python benchmarks/run.py compare [RESULTS] [--baseline FILE] [--tolerance 0.25]
+
+`run` times each benchmark on the fixtures in fixtures/ and writes the results
+to benchmarks/results.json (or --output). Nothing is fetched from the network:
+
+- cleansing_text_to_feed, html_to_markdown, html_to_notion and martian:
+  the saved pages in fixtures/pages
+- organize_notion_blocks: the Notion blocks in fixtures/notion, whose images
+  are either on gyazo already or found in the gyazo index
+- label_text: the cleansed pages, with the models in the local cache of
+  huggingface, on CPU
+- extract_arxiv_source and rasterize_figures: the e-prints in fixtures/arxiv
+- dedup: URL canonicalization and the seen-URL store on synthetic URLs
+
+A benchmark which cannot run here, e.g. martian without Node.js or
+label_text without the models downloaded, is recorded as skipped.
+Regenerate the fixtures with benchmarks/make_fixtures.py.
+
+`compare` compares the median of each case with a baseline, which is
+a results file kept from an earlier run on the same machine, e.g.
+`python benchmarks/run.py run --output benchmarks/baseline.json`, and exits
+with 1 if any case is slower by more than the tolerance.
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import traceback
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterator
+
+# models are read from the local cache only, and run on CPU
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+ROOT = Path(__file__).resolve().parents[1]
+FIXTURES = ROOT / "fixtures"
+sys.path.append(str(ROOT))
+
+from benchmarks.seen_urls import make_urls  # noqa: E402
+
+BENCHMARKS: dict[str, Callable[[Path], Iterator["Case"]]] = {}
+
+
+class Skip(Exception):
+    """Raised by a benchmark which cannot run in this environment."""
+
+
+@dataclass
+class Case:
+    name: str
+    run: Callable
+    # called before each run, out of the timing, to get the arguments of `run`
+    setup: Callable[[], tuple] = field(default=tuple)
+    # upper bound of the runs, for the slow cases
+    max_repeat: int | None = None
+
+
+def benchmark(func: Callable[[Path], Iterator[Case]]):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def pages() -> list[Path]:
+    return sorted((FIXTURES / "pages").glob("*.html"))
+
+
+def eprints() -> list[Path]:
+    return sorted((FIXTURES / "arxiv").glob("*.gz"))
+
+
+def eprint_id(eprint: Path) -> str:
+    return eprint.name.removesuffix(".gz").removesuffix(".tar")
+
+
+@benchmark
+def cleansing_text_to_feed(tmp: Path) -> Iterator[Case]:
+    from lib import cleansing_text_to_feed, html_to_markdown
+
+    for page in pages():
+        markdown = html_to_markdown(page.read_text())
+        yield Case(page.stem, cleansing_text_to_feed, lambda text=markdown: (text,))
+
+
+@benchmark
+def html_to_markdown(tmp: Path) -> Iterator[Case]:
+    from lib import html_to_markdown
+
+    for page in pages():
+        yield Case(page.stem, html_to_markdown, lambda html=page.read_text(): (html,))
+
+
+@benchmark
+def html_to_notion(tmp: Path) -> Iterator[Case]:
+    from lib import html_to_notion
+
+    def convert(html: str) -> list:
+        return list(html_to_notion(html))
+
+    for page in pages():
+        yield Case(page.stem, convert, lambda html=page.read_text(): (html,))
+
+
+@benchmark
+def martian(tmp: Path) -> Iterator[Case]:
+    from lib import html_to_markdown
+    from lib.node_sidecar import markdown_to_notion
+
+    try:
+        markdown_to_notion("# ping", tmp)
+    except Exception as e:
+        raise Skip(f"the Node.js sidecar is not available: {e}")
+
+    for page in pages():
+        markdown = html_to_markdown(page.read_text())
+        yield Case(page.stem, markdown_to_notion, lambda text=markdown: (text, tmp))
+
+
+@benchmark
+def organize_notion_blocks(tmp: Path) -> Iterator[Case]:
+    import hashlib
+
+    from lib import KeyValueStore, ProcessedContent
+    from lib.post_to_notion import organize_notion_blocks
+
+    resources = FIXTURES / "notion"
+    # every local image has been uploaded, so that nothing is sent to gyazo
+    gyazo_index = KeyValueStore(":memory:")
+    gyazo_index.set_many(
+        {
+            hashlib.sha256(image.read_bytes()).hexdigest(): (
+                f"https://i.gyazo.com/{image.stem}.png"
+            )
+            for image in (resources / "figures").glob("*.png")
+        }
+    )
+
+    for fixture in sorted(resources.glob("*.json")):
+        blocks = json.loads(fixture.read_text())
+
+        def setup(blocks: list = blocks) -> tuple:
+            content = ProcessedContent(
+                title="",
+                url="",
+                html_content="",
+                markdown_content=None,
+                notion_content=copy.deepcopy(blocks),
+                cleansed_content="",
+                resource_path=resources,
+            )
+            return (content, "", gyazo_index)
+
+        yield Case(fixture.stem, organize_notion_blocks, setup)
+
+
+@benchmark
+def label_text(tmp: Path) -> Iterator[Case]:
+    from config import CANDIDATE_LABELS
+    from lib import cleansing_text_to_feed, html_to_markdown
+    from lib import label_text as label
+    from lib import label_texts
+
+    texts = {
+        page.stem: cleansing_text_to_feed(html_to_markdown(page.read_text()))
+        for page in pages()
+    }
+    try:
+        label(next(iter(texts.values())), CANDIDATE_LABELS)
+    except (ImportError, OSError) as e:
+        raise Skip(f"the models are not available offline: {e}")
+
+    for name, text in texts.items():
+        yield Case(
+            name,
+            label,
+            lambda text=text: (text, CANDIDATE_LABELS),
+            max_repeat=5,
+        )
+    yield Case(
+        "batch",
+        label_texts,
+        lambda: (list(texts.values()), CANDIDATE_LABELS),
+        max_repeat=5,
+    )
+
+
+@benchmark
+def extract_arxiv_source(tmp: Path) -> Iterator[Case]:
+    from lib import extract_arxiv_source
+
+    for eprint in eprints():
+        yield Case(
+            eprint_id(eprint),
+            extract_arxiv_source,
+            lambda eprint=eprint: (eprint, Path(tempfile.mkdtemp(dir=tmp))),
+        )
+
+
+@benchmark
+def rasterize_figures(tmp: Path) -> Iterator[Case]:
+    from lib import FigureRasterizer, extract_arxiv_source
+
+    rasterizer = FigureRasterizer()
+
+    def setup(eprint: Path) -> tuple:
+        workspace = Path(tempfile.mkdtemp(dir=tmp))
+        extract_arxiv_source(eprint, workspace)
+        return (workspace,)
+
+    for eprint in eprints():
+        workspace = setup(eprint)[0]
+        if not any(workspace.rglob("*.pdf")):
+            continue
+
+        rasterizer.rasterize(workspace)
+        if not all(
+            pdf.with_suffix(".png").exists() for pdf in workspace.rglob("*.pdf")
+        ):
+            raise Skip("PDF figures cannot be rendered, is poppler installed?")
+
+        yield Case(
+            eprint_id(eprint),
+            rasterizer.rasterize,
+            lambda eprint=eprint: setup(eprint),
+            max_repeat=5,
+        )
+
+
+@benchmark
+def dedup(tmp: Path) -> Iterator[Case]:
+    from lib import SeenUrlStore, canonicalize_url
+
+    history = make_urls(100000)
+    store = SeenUrlStore(tmp / "urls.log")
+    store.add_many(history)
+    # a poll in which half of the URLs have been seen, as pdf links
+    incoming = [url.replace("/abs/", "/pdf/") for url in history[:5000]] + make_urls(
+        110000
+    )[100000:105000]
+
+    def canonicalize(urls: list[str]) -> list[str]:
+        return [canonicalize_url(url) for url in urls]
+
+    yield Case("canonicalize_url", canonicalize, lambda: (incoming,))
+    yield Case("filter_new", store.filter_new, lambda: (incoming,))
+
+
+def time_case(case: Case, repeat: int) -> dict:
+    # the first run warms up caches, pools and lazily loaded modules
+    case.run(*case.setup())
+
+    durations = []
+    for _ in range(min(repeat, case.max_repeat or repeat)):
+        args = case.setup()
+        started = time.perf_counter()
+        case.run(*args)
+        durations.append(time.perf_counter() - started)
+
+    durations.sort()
+    return {
+        "runs": len(durations),
+        "median_ms": round(statistics.median(durations) * 1e3, 4),
+        "min_ms": round(durations[0] * 1e3, 4),
+        "p95_ms": round(
+            durations[min(len(durations) - 1, int(0.95 * len(durations)))] * 1e3, 4
+        ),
+    }
+
+
+def run(args: argparse.Namespace) -> None:
+    names = args.only or list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        sys.exit(
+            f"Unknown benchmarks: {sorted(unknown)}, choose from {list(BENCHMARKS)}"
+        )
+
+    results = {}
+    for name in names:
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                for case in BENCHMARKS[name](Path(tmp)):
+                    key = f"{name}/{case.name}"
+                    results[key] = time_case(case, args.repeat)
+                    print(
+                        f"{key:<50} {results[key]['median_ms']:>12.3f} ms "
+                        f"(min {results[key]['min_ms']:.3f}, "
+                        f"p95 {results[key]['p95_ms']:.3f}, "
+                        f"{results[key]['runs']} runs)"
+                    )
+            except Skip as e:
+                results[name] = {"skipped": str(e)}
+                print(f"{name:<50} skipped: {e}")
+            except Exception as e:
+                traceback.print_exc()
+                results[name] = {"skipped": f"failed: {e!r}"}
+                print(f"{name:<50} failed: {e!r}")
+
+    args.output.write_text(
+        json.dumps(
+            {
+                "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "processor": platform.processor(),
+                "cpu_count": os.cpu_count(),
+                "repeat": args.repeat,
+                "results": results,
+            },
+            indent=1,
+        )
+        + "\n"
+    )
+    print(f"Wrote {args.output}")
+
+
+def compare(args: argparse.Namespace) -> None:
+    current = json.loads(args.results.read_text())["results"]
+    baseline = json.loads(args.baseline.read_text())["results"]
+
+    regressions = 0
+    for key in sorted(set(current) | set(baseline)):
+        now, base = current.get(key, {}), baseline.get(key, {})
+        if "median_ms" not in now or "median_ms" not in base:
+            if "skipped" in now:
+                status = f"skipped: {now['skipped']}"
+            elif "skipped" in base:
+                status = f"skipped in the baseline: {base['skipped']}"
+            else:
+                status = "new" if "median_ms" in now else "missing"
+            print(f"{key:<50} {status}")
+            continue
+
+        change = now["median_ms"] / base["median_ms"] - 1 if base["median_ms"] else 0
+        slower = now["median_ms"] - base["median_ms"] > args.min_delta_ms
+        if change > args.tolerance and slower:
+            status = "REGRESSION"
+            regressions += 1
+        elif change < -args.tolerance:
+            status = "improved"
+        else:
+            status = "ok"
+        print(
+            f"{key:<50} {base['median_ms']:>12.3f} -> {now['median_ms']:>12.3f} ms "
+            f"({change:+.1%}) {status}"
+        )
+
+    print(f"{regressions} regression(s) beyond {args.tolerance:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    subparsers = argparser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument(
+        "--only", nargs="+", help=f"benchmarks to run, among {list(BENCHMARKS)}"
+    )
+    run_parser.add_argument("--repeat", type=int, default=20)
+    run_parser.add_argument(
+        "--output", type=Path, default=ROOT / "benchmarks" / "results.json"
+    )
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="flag regressions against a baseline"
+    )
+    compare_parser.add_argument(
+        "results",
+        nargs="?",
+        type=Path,
+        default=ROOT / "benchmarks" / "results.json",
+    )
+    compare_parser.add_argument(
+        "--baseline", type=Path, default=ROOT / "benchmarks" / "baseline.json"
+    )
+    compare_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="relative slowdown of the median which is a regression",
+    )
+    compare_parser.add_argument(
+        "--min-delta-ms",
+        type=float,
+        default=0.05,
+        help="slowdowns smaller than this are ignored as noise",
+    )
+    compare_parser.set_defaults(func=compare)
+
+    args = argparser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark the seen-URL store against the old compare_and_save_urls.
+
+Usage:
+    python benchmarks/seen_urls.py [--sizes 1000 100000 500000] [--lookups 10000]
+
+For each size, a log of that many distinct URLs is written to a temporary
+directory, and the following are measured:
+
+- load: time to open the store (the log is read once per process)
+- lookup: mean latency of a membership check of a URL, half of which are seen
+- legacy: time of one call of the old implementation, which reads the
+  whole log into a list and compares against it on every poll
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from lib.seen_urls import SeenUrlStore  # noqa: E402
+
+
+def make_urls(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    urls = []
+    for i in range(n):
+        if i % 4 == 0:
+            urls.append(f"https://arxiv.org/abs/{2000 + i // 100000}.{i % 100000:05d}")
+        else:
+            urls.append(
+                f"https://example{rng.randrange(1000)}.com/posts/{i}?utm_source=x"
+            )
+    return urls
+
+
+def legacy_compare(urls: list[str], path: Path) -> list[str]:
+    with open(path, "r") as f:
+        previous_urls = f.read().splitlines()
+    return list(set(urls) - set(previous_urls))
+
+
+def bench(size: int, lookups: int) -> dict:
+    urls = make_urls(size)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "urls.log"
+        SeenUrlStore(path).add_many(urls)
+
+        started = time.perf_counter()
+        store = SeenUrlStore(path)
+        load = time.perf_counter() - started
+
+        queries = random.Random(1).sample(urls, min(lookups // 2, size))
+        queries += make_urls(size + lookups - len(queries))[size:]
+        queries = [url.replace("/abs/", "/pdf/") + "v2" for url in queries]
+        started = time.perf_counter()
+        hits = sum(url in store for url in queries)
+        lookup = (time.perf_counter() - started) / len(queries)
+
+        legacy_path = Path(tmp) / "legacy.log"
+        legacy_path.write_text("\n".join(urls))
+        started = time.perf_counter()
+        legacy_compare(urls[:5], legacy_path)
+        legacy = time.perf_counter() - started
+
+    return {
+        "size": size,
+        "load_s": round(load, 4),
+        "lookup_us": round(lookup * 1e6, 2),
+        "hits": hits,
+        "legacy_call_s": round(legacy, 4),
+    }
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    argparser.add_argument("--lookups", type=int, default=10000)
+    args = argparser.parse_args()
+
+    for size in args.sizes:
+        print(json.dumps(bench(size, args.lookups)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,39 @@
 from .config import (
     ARXIV_CATEGORIES,
+    BACKFILL_CHECKPOINT_PATH,
     CACHE_PATH,
     CANDIDATE_LABELS,
+    DATA_PATH,
     DATABASE_ID,
+    DM_POLL_MAX_INTERVAL,
+    DM_POLL_MIN_INTERVAL,
+    ENGRAFO_COMMAND,
+    ENGRAFO_CONTAINERS,
+    ENGRAFO_TIMEOUT,
+    FIGURE_DPI,
+    FIGURE_MAX_SIZE,
+    FIGURE_WORKERS,
     GYAZO_ACCESS_TOKEN,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_POOL_MAXSIZE,
+    HTTP_READ_TIMEOUT,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_DELAY,
+    LABEL_PREFILTER_TOP_K,
+    METRICS_MAX_MB,
+    METRICS_PATH,
+    METRICS_PORT,
+    MODEL_IDLE_TIMEOUT,
+    MODEL_MEMORY_BUDGET_MB,
     NOTION_ACCESS_TOKEN,
+    NOTION_CONVERTER,
+    PAGE_CACHE_MAX_MB,
+    PAGE_CACHE_TTL,
+    PIPELINE_CLASSIFY_CONCURRENCY,
+    PIPELINE_EXTRACT_CONCURRENCY,
+    PIPELINE_FETCH_CONCURRENCY,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_UPLOAD_CONCURRENCY,
     TWITTER_ACCESS_TOKEN,
     TWITTER_API_KEY,
     TWITTER_API_SECRET,
@@ -16,8 +45,10 @@ from .config import (
 
 __all__ = [
     "CANDIDATE_LABELS",
+    "LABEL_PREFILTER_TOP_K",
     "DATABASE_ID",
     "NOTION_ACCESS_TOKEN",
+    "NOTION_CONVERTER",
     "GYAZO_ACCESS_TOKEN",
     "TWITTER_ACCESS_TOKEN",
     "TWITTER_API_KEY",
@@ -25,7 +56,34 @@ __all__ = [
     "TWITTER_BEARER_TOKEN",
     "TWITTER_TOKEN_SECRET",
     "TWITTER_USER_NAME",
+    "DM_POLL_MIN_INTERVAL",
+    "DM_POLL_MAX_INTERVAL",
+    "JOB_MAX_ATTEMPTS",
+    "JOB_RETRY_DELAY",
+    "PIPELINE_FETCH_CONCURRENCY",
+    "PIPELINE_EXTRACT_CONCURRENCY",
+    "PIPELINE_CLASSIFY_CONCURRENCY",
+    "PIPELINE_UPLOAD_CONCURRENCY",
+    "PIPELINE_QUEUE_SIZE",
     "URLS_LOG_PATH",
     "CACHE_PATH",
+    "DATA_PATH",
+    "BACKFILL_CHECKPOINT_PATH",
+    "METRICS_PATH",
+    "METRICS_MAX_MB",
+    "METRICS_PORT",
     "ARXIV_CATEGORIES",
+    "MODEL_MEMORY_BUDGET_MB",
+    "MODEL_IDLE_TIMEOUT",
+    "HTTP_CONNECT_TIMEOUT",
+    "HTTP_READ_TIMEOUT",
+    "HTTP_POOL_MAXSIZE",
+    "PAGE_CACHE_TTL",
+    "PAGE_CACHE_MAX_MB",
+    "FIGURE_DPI",
+    "FIGURE_MAX_SIZE",
+    "FIGURE_WORKERS",
+    "ENGRAFO_CONTAINERS",
+    "ENGRAFO_COMMAND",
+    "ENGRAFO_TIMEOUT",
 ]
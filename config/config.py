@@ -12,6 +12,9 @@ load_dotenv()
 DATABASE_ID = os.getenv("DATABASE_ID")
 # Access token of the integration (https://www.notion.so/my-integrations)
 NOTION_ACCESS_TOKEN = os.getenv("NOTION_ACCESS_TOKEN")
+# How web pages are converted to Notion blocks: "native" converts the HTML directly,
+# "martian" converts it to Markdown first and uses martian (Node.js).
+NOTION_CONVERTER = os.getenv("NOTION_CONVERTER", "native")
 
 ########################################################################
 # Twitter
@@ -25,6 +28,27 @@ TWITTER_ACCESS_TOKEN = os.getenv("TWITTER_ACCESS_TOKEN")
 TWITTER_TOKEN_SECRET = os.getenv("TWITTER_TOKEN_SECRET")
 # Your Twitter username (without @)
 TWITTER_USER_NAME = os.getenv("TWITTER_USER_NAME")
+# Direct messages are polled every DM_POLL_MIN_INTERVAL seconds while links keep
+# arriving, and the interval doubles after each poll without any up to the maximum
+DM_POLL_MIN_INTERVAL = float(os.getenv("DM_POLL_MIN_INTERVAL", 60))
+DM_POLL_MAX_INTERVAL = float(os.getenv("DM_POLL_MAX_INTERVAL", 1800))
+
+########################################################################
+# Jobs
+########################################################################
+# A failed URL is retried after JOB_RETRY_DELAY seconds, doubled at each retry,
+# and given up after JOB_MAX_ATTEMPTS attempts
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", 60))
+# URLs of the watcher and of main.py --worker/--backfill go through overlapped
+# stages: fetch, extract, classify and upload. Number of URLs processed at the same
+# time by each stage, and number of URLs waiting in front of each stage before the
+# previous one pauses
+PIPELINE_FETCH_CONCURRENCY = int(os.getenv("PIPELINE_FETCH_CONCURRENCY", 4))
+PIPELINE_EXTRACT_CONCURRENCY = int(os.getenv("PIPELINE_EXTRACT_CONCURRENCY", 2))
+PIPELINE_CLASSIFY_CONCURRENCY = int(os.getenv("PIPELINE_CLASSIFY_CONCURRENCY", 1))
+PIPELINE_UPLOAD_CONCURRENCY = int(os.getenv("PIPELINE_UPLOAD_CONCURRENCY", 4))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 4))
 
 ########################################################################
 # Gyazo
@@ -82,6 +106,61 @@ CANDIDATE_LABELS = [
     "lifehack",
     "business",
 ]
+# If set, only this many labels closest to the text in the sentence-embedding space
+# are scored by the zero-shot-classification model, which makes labeling faster
+# when there are many candidate labels. Empty means all labels are scored.
+LABEL_PREFILTER_TOP_K = (
+    int(os.getenv("LABEL_PREFILTER_TOP_K"))
+    if os.getenv("LABEL_PREFILTER_TOP_K")
+    else None
+)
+
+########################################################################
+# Models
+########################################################################
+# Upper bound (MiB) of the memory used by the models kept loaded in the process.
+# Least recently used models are unloaded when it is exceeded. Empty means unbounded.
+MODEL_MEMORY_BUDGET_MB = (
+    float(os.getenv("MODEL_MEMORY_BUDGET_MB"))
+    if os.getenv("MODEL_MEMORY_BUDGET_MB")
+    else None
+)
+# Models which have not been used for this many seconds are unloaded.
+MODEL_IDLE_TIMEOUT = float(os.getenv("MODEL_IDLE_TIMEOUT", 1800))
+
+########################################################################
+# HTTP
+########################################################################
+# Timeouts (seconds) of every outbound HTTP request, so that a hung host does not stall the watcher
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 10))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 60))
+# Number of kept-alive connections per host
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 8))
+# Fetched pages are reused without asking the server for this many seconds,
+# and revalidated with a conditional request afterwards
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", 86400))
+# Upper bound (MiB) of the cache of fetched pages
+PAGE_CACHE_MAX_MB = float(os.getenv("PAGE_CACHE_MAX_MB", 512))
+
+########################################################################
+# arXiv
+########################################################################
+# PDF figures of arXiv sources are converted to PNG by rendering only their first page
+# at this resolution, scaled down to fit in FIGURE_MAX_SIZE x FIGURE_MAX_SIZE pixels
+FIGURE_DPI = int(os.getenv("FIGURE_DPI", 150))
+FIGURE_MAX_SIZE = int(os.getenv("FIGURE_MAX_SIZE", 2000))
+# Number of processes rendering PDF figures. Empty means the number of CPUs.
+FIGURE_WORKERS = (
+    int(os.getenv("FIGURE_WORKERS")) if os.getenv("FIGURE_WORKERS") else None
+)
+# Names of the engrafo containers, separated by commas. Papers are rendered
+# in parallel, one per container.
+ENGRAFO_CONTAINERS = os.getenv("ENGRAFO_CONTAINERS", "engrafo").split(",")
+# If set, this local command is run instead of engrafo in the containers,
+# with the source directory appended twice (input and output)
+ENGRAFO_COMMAND = os.getenv("ENGRAFO_COMMAND")
+# Renders taking longer than this many seconds are killed
+ENGRAFO_TIMEOUT = float(os.getenv("ENGRAFO_TIMEOUT", 1000))
 
 ########################################################################
 # Path
@@ -89,6 +168,23 @@ CANDIDATE_LABELS = [
 # Path to the directory where the tmp file or log is located
 CACHE_PATH = Path("content")
 URLS_LOG_PATH = CACHE_PATH / "urls.log"
+# Path to the directory where persistent indexes (e.g. uploaded images) are located
+DATA_PATH = Path("data")
+# URLs archived by `main.py --backfill` are recorded here, and skipped by the next run
+BACKFILL_CHECKPOINT_PATH = DATA_PATH / "backfill.log"
+
+########################################################################
+# Metrics
+########################################################################
+# Timings of the stages of each job (fetch, engrafo, classification, ...) are
+# written here as JSON lines, rotated at METRICS_MAX_MB MiB
+METRICS_PATH = DATA_PATH / "spans.jsonl"
+METRICS_MAX_MB = float(os.getenv("METRICS_MAX_MB", 64))
+# The watcher serves the metrics for Prometheus at http://<host>:METRICS_PORT/metrics.
+# Empty means not served.
+METRICS_PORT = (
+    int(os.getenv("METRICS_PORT", 9464)) if os.getenv("METRICS_PORT", "9464") else None
+)
 
 ########################################################################
 # arXiv Categories
@@ -1,13 +1,17 @@
-import sys
 import time
-import subprocess
 import logging
+import threading
 from logging import getLogger
 
-import schedule
 from tweepy import Client
 
 from config import (
+    DATA_PATH,
+    DM_POLL_MAX_INTERVAL,
+    DM_POLL_MIN_INTERVAL,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_DELAY,
+    METRICS_PORT,
     TWITTER_ACCESS_TOKEN,
     TWITTER_API_KEY,
     TWITTER_API_SECRET,
@@ -16,28 +20,56 @@ from config import (
     TWITTER_USER_NAME,
     URLS_LOG_PATH,
 )
-from lib import compare_and_save_urls, retrieve_urls_from_direct_message
+from lib import (
+    AdaptiveInterval,
+    JobQueue,
+    archive_jobs,
+    get_seen_url_store,
+    get_session,
+    get_store,
+    get_user_id,
+    metrics,
+    pool_stats,
+    prefetch_arxiv_papers,
+    retrieve_urls_from_direct_message,
+    save_direct_message_cursor,
+    serve_metrics,
+)
+from main import PIPELINE_KWARGS, STAGE_KWARGS
 
 
-def task():
-    urls = retrieve_urls_from_direct_message(client, user_name=TWITTER_USER_NAME)
-    new_urls = compare_and_save_urls(urls, urls_save_path=URLS_LOG_PATH)
+def task() -> bool:
+    state = get_store(DATA_PATH / "watcher.sqlite3")
+    user_id = get_user_id(client, TWITTER_USER_NAME, state)
+    urls, cursor = retrieve_urls_from_direct_message(
+        client,
+        user_id=user_id,
+        num_retrieves=50,
+        link_cache=get_store(DATA_PATH / "links.sqlite3"),
+        state=state,
+    )
+    seen_urls = get_seen_url_store(URLS_LOG_PATH)
+    new_urls = seen_urls.filter_new(urls)
 
     if new_urls:
         logger.info(f"Found new url: {new_urls}")
 
-        for url in new_urls:
-            logger.info(f"Starting to process and upload to Notion: {url}")
+        # a URL is marked seen only once its job is safely in the queue,
+        # so that a crash in between never loses it
+        job_queue.enqueue(new_urls)
+        seen_urls.add_many(new_urls)
+
+    # likewise, the messages are polled again until their URLs are queued
+    if cursor is not None:
+        save_direct_message_cursor(state, user_id, cursor)
+
+    if new_urls:
+        prefetch_arxiv_papers(new_urls, DATA_PATH)
 
-            try:
-                subprocess.run(
-                    ["python", "main.py", url],
-                )
-            except Exception as e:
-                logger.info(f"Failed to process and upload to Notion: {url}")
-                continue
+    logger.debug(f"Jobs: {job_queue.stats()}")
+    logger.debug(f"HTTP connection pools: {pool_stats()}")
 
-            logger.info(f"Finished processing and uploading to Notion: {url}")
+    return bool(urls)
 
 
 if __name__ == "__main__":
@@ -57,9 +89,44 @@ if __name__ == "__main__":
         access_token=TWITTER_ACCESS_TOKEN,
         access_token_secret=TWITTER_TOKEN_SECRET,
     )
+    # share the pooled connections with the other outbound calls
+    client.session = get_session()
 
-    schedule.every(30).minutes.do(task)
+    job_queue = JobQueue(
+        DATA_PATH / "jobs.sqlite3",
+        max_attempts=JOB_MAX_ATTEMPTS,
+        retry_delay=JOB_RETRY_DELAY,
+    )
+    recovered = job_queue.recover()
+    if recovered:
+        logger.info(f"Recovered {recovered} jobs interrupted by the last shutdown")
+
+    if METRICS_PORT is not None:
+        metrics.register_gauge(
+            "archive_jobs", "Jobs in each state", "state", job_queue.stats
+        )
+        serve_metrics(METRICS_PORT)
+
+    # the pipeline runs in this process, so that libraries and models
+    # are loaded only once while the watcher is alive
+    threading.Thread(
+        target=archive_jobs,
+        args=(job_queue,),
+        kwargs={**STAGE_KWARGS, **PIPELINE_KWARGS},
+        name="pipeline",
+        daemon=True,
+    ).start()
+
+    # poll often while links keep coming, and back off while there are none
+    interval = AdaptiveInterval(DM_POLL_MIN_INTERVAL, DM_POLL_MAX_INTERVAL)
 
     while True:
-        schedule.run_pending()
-        time.sleep(1)
+        try:
+            active = task()
+        except Exception:
+            logger.exception("Failed to poll direct messages")
+            active = False
+
+        wait = interval.next(active)
+        logger.debug(f"Next poll in {wait:.0f}s")
+        time.sleep(wait)
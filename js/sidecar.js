@@ -0,0 +1,85 @@
+import { Readability } from "@mozilla/readability";
+import { JSDOM } from "jsdom";
+import matter from "gray-matter";
+import { markdownToBlocks } from "@tryfabric/martian";
+import readline from "readline";
+
+// Long-running helper which serves readable.js and markdown_to_notion.js
+// over stdin/stdout, so that jsdom, readability and martian are loaded once.
+//
+// Each line of stdin is a JSON-RPC request:
+//   {"jsonrpc": "2.0", "id": 1, "method": "readable", "params": {"url": "..."}}
+// and each line of stdout is the response:
+//   {"jsonrpc": "2.0", "id": 1, "result": ...} or {"jsonrpc": "2.0", "id": 1, "error": {...}}
+// Requests are handled concurrently, so responses may come out of order.
+
+// stdout is reserved for responses
+console.log = console.error;
+console.info = console.error;
+
+function parseArticle(html) {
+  const doc = new JSDOM(html).window.document;
+  const reader = new Readability(doc);
+  return reader.parse();
+}
+
+const methods = {
+  ping: async () => "pong",
+
+  // same as readable.js: extract the article from a URL or from a raw HTML
+  readable: async ({ url, html }) => {
+    if (html === undefined) {
+      // node-fetch is only needed on node versions without a global fetch
+      const fetch = globalThis.fetch ?? (await import("node-fetch")).default;
+      const response = await fetch(url);
+      html = await response.text();
+    }
+    return parseArticle(html);
+  },
+
+  // same as markdown_to_notion.js
+  markdown_to_notion: async ({ markdown }) => {
+    const matterResult = matter(markdown);
+    return markdownToBlocks(matterResult.content, {
+      strictImageUrls: false,
+    });
+  },
+};
+
+function respond(message) {
+  process.stdout.write(JSON.stringify({ jsonrpc: "2.0", ...message }) + "\n");
+}
+
+async function handle(line) {
+  let request;
+  try {
+    request = JSON.parse(line);
+  } catch (e) {
+    respond({ id: null, error: { code: -32700, message: "parse error" } });
+    return;
+  }
+
+  const method = methods[request.method];
+  if (method === undefined) {
+    respond({
+      id: request.id,
+      error: { code: -32601, message: `method not found: ${request.method}` },
+    });
+    return;
+  }
+
+  try {
+    const result = await method(request.params || {});
+    respond({ id: request.id, result });
+  } catch (e) {
+    respond({ id: request.id, error: { code: -32000, message: String(e) } });
+  }
+}
+
+const rl = readline.createInterface({ input: process.stdin, terminal: false });
+rl.on("line", (line) => {
+  if (line.trim()) {
+    handle(line);
+  }
+});
+rl.on("close", () => process.exit(0));
@@ -1,16 +1,159 @@
+from .archive_url import (
+    archive_jobs,
+    archive_url,
+    archive_urls,
+    prefetch_arxiv_papers,
+)
+from .arxiv_metadata import (
+    ArxivMetadata,
+    ArxivMetadataService,
+    get_arxiv_metadata_service,
+    parse_arxiv_id,
+)
+from .backfill import (
+    READING_LIST_FORMATS,
+    BackfillSummary,
+    backfill,
+    read_urls,
+)
+from .canonicalize_url import canonicalize_url
 from .compare_and_save_urls import compare_and_save_urls
-from .get_web_content import ProcessedContent, cleansing_text_to_feed, get_web_content
-from .label_text import classify_text, label_text
+from .download_arxiv_source import download_arxiv_source, extract_arxiv_source
+from .get_web_content import (
+    FetchedContent,
+    ProcessedContent,
+    cleansing_text_to_feed,
+    extract_web_content,
+    fetch_web_content,
+    get_web_content,
+    html_to_markdown,
+)
+from .html_to_notion import html_to_notion
+from .http_session import (
+    configure_http,
+    get_httpx_client,
+    get_notion_client,
+    get_session,
+    pool_stats,
+)
+from .job_queue import Job, JobQueue, iter_jobs
+from .kv_store import KeyValueStore, get_store
+from .label_text import (
+    classify_text,
+    classify_texts,
+    compare_prefilter,
+    label_text,
+    label_texts,
+)
+from .metrics import Metrics, Span, metrics, serve_metrics
+from .model_registry import ModelRegistry, model_registry
+from .node_sidecar import NodeSidecar, SidecarError, node_sidecar
+from .page_cache import (
+    CachedPage,
+    PageCache,
+    extract_page,
+    fetch_page,
+    fetch_readable,
+    get_page_cache,
+)
+from .pipeline import Caches, Pipeline, open_caches
+from .poll_interval import AdaptiveInterval
 from .post_to_notion import post_to_notion
-from .retrieve_urls_from_direct_message import retrieve_urls_from_direct_message
+from .rasterize_figures import FigureRasterizer, figure_rasterizer
+from .render_engrafo import (
+    DockerEngrafoRunner,
+    EngrafoRenderer,
+    EngrafoRunner,
+    LocalEngrafoRunner,
+    engrafo_renderer,
+)
+from .resolve_links import resolve_link, resolve_links
+from .retrieve_urls_from_direct_message import (
+    get_user_id,
+    retrieve_urls_from_direct_message,
+    save_direct_message_cursor,
+)
+from .seen_urls import SeenUrlStore, get_seen_url_store
+from .translate_text import split_sentences, translate_text, translate_texts
+from .workspace import job_workspace, remove_stale_workspaces
 
 __all__ = [
+    "AdaptiveInterval",
+    "archive_jobs",
+    "archive_url",
+    "archive_urls",
+    "ArxivMetadata",
+    "ArxivMetadataService",
+    "backfill",
+    "BackfillSummary",
+    "CachedPage",
+    "Caches",
+    "canonicalize_url",
     "classify_text",
+    "classify_texts",
     "cleansing_text_to_feed",
     "compare_and_save_urls",
+    "compare_prefilter",
+    "configure_http",
+    "DockerEngrafoRunner",
+    "download_arxiv_source",
+    "engrafo_renderer",
+    "EngrafoRenderer",
+    "EngrafoRunner",
+    "extract_arxiv_source",
+    "extract_page",
+    "extract_web_content",
+    "fetch_page",
+    "fetch_readable",
+    "fetch_web_content",
+    "FetchedContent",
+    "figure_rasterizer",
+    "FigureRasterizer",
+    "get_arxiv_metadata_service",
+    "get_httpx_client",
+    "get_notion_client",
+    "get_page_cache",
+    "get_seen_url_store",
+    "get_session",
+    "get_store",
+    "get_user_id",
     "get_web_content",
+    "html_to_markdown",
+    "html_to_notion",
+    "iter_jobs",
+    "Job",
+    "job_workspace",
+    "JobQueue",
+    "KeyValueStore",
     "label_text",
+    "label_texts",
+    "LocalEngrafoRunner",
+    "metrics",
+    "Metrics",
+    "model_registry",
+    "ModelRegistry",
+    "node_sidecar",
+    "NodeSidecar",
+    "open_caches",
+    "PageCache",
+    "parse_arxiv_id",
+    "Pipeline",
+    "pool_stats",
     "post_to_notion",
+    "prefetch_arxiv_papers",
     "ProcessedContent",
+    "read_urls",
+    "READING_LIST_FORMATS",
+    "remove_stale_workspaces",
+    "resolve_link",
+    "resolve_links",
     "retrieve_urls_from_direct_message",
+    "save_direct_message_cursor",
+    "SeenUrlStore",
+    "serve_metrics",
+    "SidecarError",
+    "Span",
+    "split_sentences",
+    "translate_text",
+    "translate_texts",
 ]
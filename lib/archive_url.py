@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from logging import getLogger
+from pathlib import Path
+from typing import Callable, Iterable
+
+from .arxiv_metadata import get_arxiv_metadata_service
+from .get_web_content import get_web_content
+from .job_queue import Job, JobQueue, iter_jobs
+from .kv_store import get_store
+from .label_text import label_text
+from .metrics import metrics
+from .pipeline import Pipeline, open_caches
+from .post_to_notion import post_to_notion
+from .translate_text import translate_texts
+from .workspace import job_workspace, remove_stale_workspaces
+
+logger = getLogger(__name__)
+
+
+def archive_url(
+    url: str,
+    cache_path: Path,
+    arxiv_categories: dict[str, str],
+    candidate_labels: list[str],
+    notion_access_token: str,
+    gyazo_access_token: str,
+    database_id: str,
+    threshold: float = 0.9,
+    prefilter_top_k: int | None = None,
+    data_path: Path | None = None,
+    notion_converter: str = "native",
+    page_cache_max_mb: float = 512,
+    page_cache_ttl: float = 86400,
+) -> None:
+    """Run the whole pipeline for a single URL in the current process:
+    get_web_content -> label_text -> post_to_notion.
+    Intermediate files are kept in a workspace of its own, so that
+    several URLs can be archived at the same time.
+
+    Parameters
+    ----------
+    url : str
+        URL of the web page to archive
+    cache_path : Path
+        Path to the cache directory, under which the workspace is created
+    arxiv_categories : dict[str, str]
+        Dictionary of arXiv categories.
+    candidate_labels : list[str]
+        candidate labels, which is given at 'config/config.py'
+    notion_access_token : str
+        notion access token.
+    gyazo_access_token : str
+        gyazo access token.
+    database_id : str
+        database id of the notion.
+    threshold : float, optional
+        threshold passed to label_text, by default 0.9
+    prefilter_top_k : int | None, optional
+        prefilter_top_k passed to label_text, by default None
+    data_path : Path | None, optional
+        Path to the directory where persistent indexes are kept,
+        such as uploaded gyazo images, by default None
+    notion_converter : str, optional
+        notion_converter passed to get_web_content, by default "native"
+    page_cache_max_mb : float, optional
+        size limit of the cache of fetched pages, by default 512
+    page_cache_ttl : float, optional
+        seconds during which a fetched page is reused without revalidation,
+        by default 86400
+    """
+    logger.debug(f"Fetching content from: {url}")
+
+    caches = open_caches(data_path, page_cache_max_mb, page_cache_ttl)
+
+    with metrics.job(url), job_workspace(cache_path) as workspace:
+        processed_content = get_web_content(
+            url=url,
+            cache_path=cache_path,
+            arxiv_categories=arxiv_categories,
+            workspace=workspace,
+            notion_converter=notion_converter,
+            page_cache=caches.page_cache,
+            arxiv_metadata=caches.arxiv_metadata,
+            translation_cache=caches.translation_cache,
+        )
+
+        logger.debug("Fetching content: Done!")
+        logger.debug("Labeling content using mDeBERTa-v3...")
+
+        if processed_content.tags is None:
+            processed_content.tags = label_text(
+                text=processed_content.cleansed_content,
+                candidate_labels=candidate_labels,
+                threshold=threshold,
+                prefilter_top_k=prefilter_top_k,
+            )
+
+        logger.debug("Labeling content using mDeBERTa-v3: Done!")
+        logger.debug("Uploading content to Notion...")
+
+        post_to_notion(
+            notion_access_token=notion_access_token,
+            gyazo_access_token=gyazo_access_token,
+            database_id=database_id,
+            processed_content=processed_content,
+            gyazo_index=caches.gyazo_index,
+        )
+
+        logger.debug("Uploading content to Notion: Done!")
+
+
+def archive_urls(
+    urls: Iterable[str],
+    concurrency: dict[str, int] | None = None,
+    queue_size: int = 4,
+    on_result: Callable[[str, Exception | None], object] | None = None,
+    **kwargs,
+) -> dict[str, Exception | None]:
+    """Archive a stream of URLs in the current process, so that libraries
+    and models are loaded only once. The URLs go through the overlapped
+    stages of `Pipeline`. A failure of one URL is logged and does not stop
+    the others.
+
+    Parameters
+    ----------
+    urls : Iterable[str]
+        URLs to archive. Blank lines and surrounding whitespace are ignored,
+        so a file object or sys.stdin can be given as is. If a list is given,
+        the metadata of all arXiv papers in it is fetched, and their abstracts
+        are translated, at once beforehand.
+    concurrency : dict[str, int] | None, optional
+        number of URLs processed at the same time by each stage of the
+        pipeline, by default None (the defaults of `Pipeline`)
+    queue_size : int, optional
+        number of URLs waiting in front of each stage, by default 4
+    on_result : Callable[[str, Exception | None], object] | None, optional
+        called as soon as each URL is finished, see `Pipeline.run`
+    **kwargs
+        keyword arguments passed to archive_url
+
+    Returns
+    -------
+    dict[str, Exception | None]
+        exception raised for each URL, or None if it succeeded
+    """
+    remove_stale_workspaces(kwargs["cache_path"])
+
+    if isinstance(urls, (list, tuple)) and kwargs.get("data_path") is not None:
+        prefetch_arxiv_papers(urls, kwargs["data_path"])
+
+    pipeline = Pipeline(concurrency=concurrency, queue_size=queue_size, **kwargs)
+    return asyncio.run(pipeline.run(urls, on_result=on_result))
+
+
+def archive_jobs(
+    job_queue: JobQueue,
+    concurrency: dict[str, int] | None = None,
+    queue_size: int = 4,
+    poll_interval: float = 5.0,
+    stop: threading.Event | None = None,
+    **kwargs,
+) -> None:
+    """Archive the jobs of the queue through the overlapped stages of
+    `Pipeline`, claiming each job as the stages make room for it, until
+    `stop` is set. A job is completed once its URL is archived, and retried
+    later if it fails.
+
+    Parameters
+    ----------
+    job_queue : JobQueue
+        queue to drain
+    concurrency : dict[str, int] | None, optional
+        number of URLs processed at the same time by each stage of the
+        pipeline, by default None (the defaults of `Pipeline`)
+    queue_size : int, optional
+        number of URLs waiting in front of each stage, by default 4
+    poll_interval : float, optional
+        seconds to wait when there is no job due, by default 5.0
+    stop : threading.Event | None, optional
+        event which stops claiming jobs when it is set, by default None
+    **kwargs
+        keyword arguments passed to archive_url
+    """
+    remove_stale_workspaces(kwargs["cache_path"])
+
+    pipeline = Pipeline(concurrency=concurrency, queue_size=queue_size, **kwargs)
+
+    def on_result(job: Job, error: Exception | None) -> None:
+        # the pipeline runs as long as the process, so results are not kept
+        pipeline.results.pop(job.url.strip(), None)
+        try:
+            if error is None:
+                job_queue.complete(job)
+            else:
+                job_queue.fail(job, error)
+        except Exception:
+            # the job is made pending again by `recover` at the next startup
+            logger.exception(f"Failed to update the job of {job.url}")
+
+    asyncio.run(
+        pipeline.run(iter_jobs(job_queue, poll_interval, stop), on_result=on_result)
+    )
+
+
+def prefetch_arxiv_papers(urls: Iterable[str], data_path: Path) -> None:
+    """Fetch the metadata of all arXiv papers among the URLs in as few requests
+    as possible, and translate their abstracts in shared batches, so that
+    archive_url finds them in the caches."""
+    arxiv_urls = [
+        url.strip() for url in urls if url.strip().startswith("https://arxiv.org/")
+    ]
+    if not arxiv_urls:
+        return
+
+    try:
+        metadata = get_arxiv_metadata_service(
+            data_path / "arxiv_metadata.sqlite3"
+        ).get_many(arxiv_urls)
+        translate_texts(
+            [info.summary for info in metadata.values()],
+            store=get_store(data_path / "translations.sqlite3"),
+        )
+    except Exception:
+        # each URL falls back to its own request
+        logger.exception("Failed to prefetch arXiv papers")
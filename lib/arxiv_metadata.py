@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from logging import getLogger
+from pathlib import Path
+from typing import Iterable
+
+import arxiv
+
+from .kv_store import KeyValueStore
+from .metrics import metrics
+
+logger = getLogger(__name__)
+
+# the arXiv API returns at most this many entries per request
+ARXIV_BATCH_SIZE = 100
+
+# e.g. 2301.00001v2, 0704.0001
+_NEW_STYLE_ID = r"\d{4}\.\d{4,5}"
+# e.g. hep-th/9901001v1, math.GT/0309136
+_OLD_STYLE_ID = r"[a-z][a-z\-]*(?:\.[A-Z]{2})?/\d{7}"
+_ARXIV_ID = re.compile(
+    rf"(?:^|/|arxiv:)(?P<id>{_NEW_STYLE_ID}|{_OLD_STYLE_ID})"
+    r"(?P<version>v\d+)?(?:\.pdf)?/?(?:[?#].*)?$",
+    re.I,
+)
+
+
+@dataclass
+class ArxivMetadata:
+    arxiv_id: str
+    title: str
+    summary: str
+    categories: list[str]
+    # latest version, e.g. "v2"
+    version: str = ""
+
+
+def parse_arxiv_id(url: str) -> tuple[str, str]:
+    """Get the canonical arXiv ID and the version from an arXiv URL or ID,
+    such as "https://arxiv.org/abs/2301.00001v2", "https://arxiv.org/pdf/2301.00001.pdf",
+    "arXiv:hep-th/9901001" or "2301.00001".
+
+    Parameters
+    ----------
+    url : str
+        arXiv URL or ID
+
+    Returns
+    -------
+    tuple[str, str]
+        arXiv ID without the version, and the version such as "v2",
+        which is "" if not specified
+
+    Raises
+    ------
+    ValueError
+        if no arXiv ID is found in the URL
+    """
+    match = _ARXIV_ID.search(url.strip())
+    if match is None:
+        raise ValueError(f"Not an arXiv URL: {url}")
+
+    return match.group("id"), (match.group("version") or "").lower()
+
+
+class ArxivMetadataService:
+    """Lookup of arXiv metadata, which asks the arXiv API for all missing IDs
+    at once and keeps the results in a persistent cache.
+
+    Parameters
+    ----------
+    path : str | Path, optional
+        path to the SQLite database file of the cache, by default ":memory:"
+    batch_size : int, optional
+        number of IDs per request to the arXiv API, by default 100
+    """
+
+    def __init__(
+        self,
+        path: str | Path = ":memory:",
+        batch_size: int = ARXIV_BATCH_SIZE,
+    ) -> None:
+        self.batch_size = batch_size
+        self._store = KeyValueStore(path, table="arxiv_metadata")
+        # the client waits 3 seconds between requests, as the API asks
+        self._client = arxiv.Client(page_size=batch_size, num_retries=3)
+
+    def get(self, url: str) -> ArxivMetadata:
+        """Get the metadata of an arXiv URL or ID."""
+        arxiv_id, _ = parse_arxiv_id(url)
+        metadata = self.get_many([arxiv_id])
+        if arxiv_id not in metadata:
+            raise LookupError(f"arXiv paper not found: {arxiv_id}")
+
+        return metadata[arxiv_id]
+
+    def get_many(self, urls: Iterable[str]) -> dict[str, ArxivMetadata]:
+        """Get the metadata of arXiv URLs or IDs, requesting the ones which are
+        not cached in batches of `batch_size`. URLs which are not arXiv ones,
+        and papers which are not found, are left out.
+
+        Parameters
+        ----------
+        urls : Iterable[str]
+            arXiv URLs or IDs
+
+        Returns
+        -------
+        dict[str, ArxivMetadata]
+            metadata by canonical arXiv ID
+        """
+        ids = []
+        for url in urls:
+            try:
+                arxiv_id, _ = parse_arxiv_id(url)
+            except ValueError:
+                continue
+            if arxiv_id not in ids:
+                ids.append(arxiv_id)
+
+        metadata = {
+            arxiv_id: ArxivMetadata(**json.loads(value))
+            for arxiv_id, value in self._store.get_many(ids).items()
+        }
+
+        missing = [arxiv_id for arxiv_id in ids if arxiv_id not in metadata]
+        for i in range(0, len(missing), self.batch_size):
+            with metrics.span("arxiv_lookup") as span:
+                fetched = self._fetch(missing[i : i + self.batch_size])
+                span.items = len(fetched)
+            self._store.set_many(
+                {
+                    arxiv_id: json.dumps(asdict(info), ensure_ascii=False)
+                    for arxiv_id, info in fetched.items()
+                }
+            )
+            metadata.update(fetched)
+
+        if missing:
+            logger.debug(
+                f"arXiv metadata: {len(ids) - len(missing)} cached, "
+                f"{len(missing)} requested in "
+                f"{-(-len(missing) // self.batch_size)} batch(es)"
+            )
+
+        return metadata
+
+    def _fetch(self, ids: list[str]) -> dict[str, ArxivMetadata]:
+        search = arxiv.Search(id_list=ids, max_results=len(ids))
+        try:
+            results = list(self._client.results(search))
+        except Exception:
+            if len(ids) == 1:
+                logger.exception(f"Failed to get arXiv metadata: {ids[0]}")
+                return {}
+            # an invalid ID fails the whole batch, so find it one by one
+            logger.warning(f"Failed to get arXiv metadata of {len(ids)} IDs at once")
+            fetched = {}
+            for arxiv_id in ids:
+                fetched.update(self._fetch([arxiv_id]))
+            return fetched
+
+        fetched = {}
+        for result in results:
+            try:
+                arxiv_id, version = parse_arxiv_id(result.entry_id)
+            except ValueError:
+                continue
+            fetched[arxiv_id] = ArxivMetadata(
+                arxiv_id=arxiv_id,
+                title=result.title,
+                summary=result.summary,
+                categories=list(result.categories),
+                version=version,
+            )
+        return fetched
+
+
+@lru_cache(maxsize=None)
+def get_arxiv_metadata_service(path: str | Path = ":memory:") -> ArxivMetadataService:
+    """Get the metadata service of the cache path, which is opened once per process."""
+    return ArxivMetadataService(path)
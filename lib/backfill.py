@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import csv
+import html
+import re
+import time
+from dataclasses import dataclass, field
+from itertools import chain
+from logging import getLogger
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .archive_url import archive_urls
+from .seen_urls import SeenUrlStore
+
+logger = getLogger(__name__)
+
+READING_LIST_FORMATS = ("auto", "text", "csv", "bookmarks")
+# header of the CSV column holding the URLs, compared case-insensitively
+URL_COLUMNS = ("url", "href", "link", "uri")
+
+# link of a browser bookmarks export (Netscape bookmark file format)
+_BOOKMARK = re.compile(r"<a\s[^>]*?href=\"([^\"]*)\"", re.IGNORECASE)
+
+
+@dataclass
+class BackfillSummary:
+    archived: int = 0
+    # URLs finished by a previous run, or appearing twice in the input
+    skipped: int = 0
+    failed: dict[str, Exception] = field(default_factory=dict)
+    elapsed: float = 0.0
+    interrupted: bool = False
+
+    def __str__(self) -> str:
+        processed = self.archived + len(self.failed)
+        rate = processed / self.elapsed * 60 if self.elapsed > 0 else 0.0
+        lines = [
+            f"Backfill {'interrupted' if self.interrupted else 'finished'}: "
+            f"{self.archived} archived, {len(self.failed)} failed, "
+            f"{self.skipped} skipped in {self.elapsed:.1f}s "
+            f"({rate:.1f} URLs/min)"
+        ]
+        if self.failed:
+            lines.append("Failed URLs (retried by the next run):")
+            lines.extend(f"  {url}: {e!r}" for url, e in self.failed.items())
+        return "\n".join(lines)
+
+
+def read_urls(lines: Iterable[str], format: str = "auto") -> Iterator[str]:
+    """Read URLs from a reading list.
+
+    Parameters
+    ----------
+    lines : Iterable[str]
+        lines of the reading list, e.g. a file object or sys.stdin
+    format : str, optional
+        one of the following, by default "auto" (guessed from the first line)
+
+        - "text": one URL per line, "#" starts a comment
+        - "csv": the column named as one of `URL_COLUMNS`, or the first
+          cell of each row which looks like a URL if there is no header
+        - "bookmarks": the links of a browser bookmarks export (HTML)
+
+    Yields
+    ------
+    str
+        URL
+    """
+    if format not in READING_LIST_FORMATS:
+        raise ValueError(
+            f"Unknown format: {format}, expected one of {READING_LIST_FORMATS}"
+        )
+
+    lines = iter(lines)
+    if format == "auto":
+        head = []
+        for line in lines:
+            head.append(line)
+            if line.strip() and not line.startswith("#"):
+                break
+        format = _guess_format(head[-1] if head else "")
+        lines = chain(head, lines)
+        logger.debug(f"Reading URLs as {format}")
+
+    if format == "text":
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+    elif format == "csv":
+        column = None
+        for i, row in enumerate(csv.reader(lines)):
+            cells = [cell.strip() for cell in row]
+            if i == 0:
+                header = [cell.lower() for cell in cells]
+                column = next(
+                    (header.index(name) for name in URL_COLUMNS if name in header),
+                    None,
+                )
+                if column is not None:
+                    continue
+            if column is not None:
+                url = cells[column] if column < len(cells) else ""
+            else:
+                url = next((cell for cell in cells if _is_url(cell)), "")
+            if _is_url(url):
+                yield url
+    else:
+        for line in lines:
+            for href in _BOOKMARK.findall(line):
+                url = html.unescape(href).strip()
+                # skips bookmarklets, place: queries of Firefox, etc.
+                if _is_url(url):
+                    yield url
+
+
+def backfill(
+    urls: Iterable[str],
+    checkpoint_path: str | Path,
+    **kwargs,
+) -> BackfillSummary:
+    """Archive a reading list in one process, skipping the URLs recorded in
+    the checkpoint file, and recording each URL there as soon as it is
+    archived, so that an interrupted backfill resumes where it stopped.
+    Failed URLs are not recorded, and are retried by the next run.
+
+    Parameters
+    ----------
+    urls : Iterable[str]
+        URLs to archive, e.g. given by `read_urls`
+    checkpoint_path : str | Path
+        path to the checkpoint file, e.g. data/backfill.log
+    **kwargs
+        keyword arguments passed to archive_urls
+
+    Returns
+    -------
+    BackfillSummary
+        numbers of archived, failed and skipped URLs, and the elapsed time
+    """
+    checkpoint = SeenUrlStore(checkpoint_path)
+    summary = BackfillSummary()
+
+    urls = list(urls)
+    pending = checkpoint.filter_new(urls)
+    summary.skipped = len(urls) - len(pending)
+
+    logger.info(
+        f"Backfilling {len(pending)} URLs, "
+        f"{summary.skipped} skipped by the checkpoint {checkpoint_path}"
+    )
+
+    def on_result(url: str, error: Exception | None) -> None:
+        if error is None:
+            checkpoint.add(url)
+            summary.archived += 1
+        else:
+            summary.failed[url] = error
+
+    start = time.monotonic()
+    try:
+        # a list lets archive_urls fetch the arXiv metadata at once beforehand
+        archive_urls(pending, on_result=on_result, **kwargs)
+    except KeyboardInterrupt:
+        summary.interrupted = True
+    summary.elapsed = time.monotonic() - start
+
+    return summary
+
+
+def _guess_format(line: str) -> str:
+    line = line.strip()
+    if line.startswith("<"):
+        return "bookmarks"
+    # a line of only a URL starts a plain list even if the URL has commas
+    # (e.g. ?q=1,2), while a CSV starts with a header, or cells such as titles
+    if _is_url(line) and not any(c.isspace() for c in line):
+        return "text"
+    return "csv"
+
+
+def _is_url(text: str) -> bool:
+    return text.startswith(("http://", "https://"))
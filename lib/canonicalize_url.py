@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .arxiv_metadata import parse_arxiv_id
+
+# query parameters which only track where a visitor came from
+TRACKING_PARAMS = {
+    "fbclid",
+    "gclid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "ref_src",
+    "ref_url",
+    "si",
+    "spm",
+    "yclid",
+}
+TRACKING_PREFIXES = ("utm_",)
+ARXIV_HOSTS = {"arxiv.org", "www.arxiv.org", "export.arxiv.org"}
+
+
+def canonicalize_url(url: str) -> str:
+    """Canonicalize the URL, so that the same page always gets the same key:
+    lowercase scheme & host, no default port, no fragment, no tracking
+    parameters, sorted query and no trailing slash.
+    Every URL of an arXiv paper (abs or pdf, any version) becomes
+    https://arxiv.org/abs/<arXiv ID>.
+
+    Parameters
+    ----------
+    url : str
+        URL to canonicalize
+
+    Returns
+    -------
+    str
+        canonical URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+
+    if host in ARXIV_HOSTS and parts.path.startswith(("/abs/", "/pdf/")):
+        try:
+            arxiv_id, _ = parse_arxiv_id(parts.path)
+        except ValueError:
+            pass
+        else:
+            return f"https://arxiv.org/abs/{arxiv_id}"
+
+    if parts.port is not None and (scheme, parts.port) not in (
+        ("http", 80),
+        ("https", 443),
+    ):
+        host = f"{host}:{parts.port}"
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS
+        and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+
+    path = parts.path or "/"
+    if path != "/":
+        path = path.rstrip("/")
+
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
@@ -2,11 +2,16 @@ from __future__ import annotations
 
 from pathlib import Path
 
+from .seen_urls import get_seen_url_store
+
 
 def compare_and_save_urls(urls: list[str], urls_save_path: str | Path) -> list[str]:
     """This function does the following:
-    1. Compares the given URLs with the URLs in the given file.
-    2. Saves the given URLs to the given file path.
+    1. Compares the given URLs with all URLs saved in the given file so far.
+    2. Appends the new URLs to the given file.
+
+    URLs are compared after canonicalization, so tracking parameters,
+    trailing slashes and arXiv abs/pdf/version variants do not matter.
 
     Arguments
     ---------
@@ -17,18 +22,4 @@ def compare_and_save_urls(urls: list[str], urls_save_path: str | Path) -> list[s
     -------
         list[str]: The URLs that are not in the given file.
     """
-    if isinstance(urls_save_path, str):
-        urls_save_path = Path(urls_save_path)
-
-    if not urls_save_path.exists():
-        urls_save_path.touch()
-
-    with open(urls_save_path, "r") as f:
-        previous_urls = f.read().splitlines()
-
-    new_urls = set(urls) - set(previous_urls)
-
-    with open(urls_save_path, "w") as f:
-        f.write("\n".join(urls))
-
-    return list(new_urls)
+    return get_seen_url_store(urls_save_path).add_many(urls)
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import gzip
+import shutil
+import tarfile
+import time
+from logging import getLogger
+from pathlib import Path, PurePosixPath
+
+import requests
+
+from .http_session import get_session
+from .metrics import metrics
+
+logger = getLogger(__name__)
+
+ARXIV_EPRINT_URL = "https://arxiv.org/e-print/{}"
+# upper bounds of an e-print, so that a huge or malicious one cannot fill the disk
+MAX_DOWNLOAD_BYTES = 256 * 2**20
+MAX_EXTRACTED_BYTES = 512 * 2**20
+MAX_MEMBERS = 5000
+# files which engrafo needs to render a paper: sources, bibliographies, styles & figures
+SOURCE_SUFFIXES = {".tex", ".bib", ".bbl", ".sty", ".cls", ".bst"}
+FIGURE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif", ".pdf", ".eps", ".ps", ".svg"}
+
+_CHUNK_SIZE = 2**16
+
+
+def download_arxiv_source(
+    arxiv_id: str,
+    output_path: Path,
+    max_download_bytes: int = MAX_DOWNLOAD_BYTES,
+    max_extracted_bytes: int = MAX_EXTRACTED_BYTES,
+    max_members: int = MAX_MEMBERS,
+    max_retries: int = 3,
+) -> list[Path]:
+    """Download the LaTeX source of an arXiv paper, and extract only the files
+    needed to render it. The e-print is either a gzipped tarball or a single
+    gzipped .tex file.
+
+    Parameters
+    ----------
+    arxiv_id : str
+        arXiv ID, optionally with the version, e.g. "2301.00001v2"
+    output_path : Path
+        directory where the files are extracted
+    max_download_bytes : int, optional
+        upper bound of the size of the e-print, by default 256 MiB
+    max_extracted_bytes : int, optional
+        upper bound of the total size of the extracted files, by default 512 MiB
+    max_members : int, optional
+        upper bound of the number of files in the tarball, by default 5000
+    max_retries : int, optional
+        number of times an interrupted download is resumed, by default 3
+    Returns
+    -------
+    list[Path]
+        extracted files
+
+    Raises
+    ------
+    ValueError
+        if the e-print has no LaTeX source, or exceeds the limits
+    """
+    output_path.mkdir(parents=True, exist_ok=True)
+    eprint = output_path / ".eprint.part"
+    started = time.perf_counter()
+
+    with metrics.span("arxiv_download") as span:
+        try:
+            _download(
+                ARXIV_EPRINT_URL.format(arxiv_id),
+                eprint,
+                max_bytes=max_download_bytes,
+                max_retries=max_retries,
+            )
+
+            files = extract_arxiv_source(
+                eprint,
+                output_path,
+                name=arxiv_id.replace("/", "_"),
+                max_extracted_bytes=max_extracted_bytes,
+                max_members=max_members,
+            )
+
+            span.bytes = eprint.stat().st_size
+            span.items = len(files)
+            logger.info(
+                f"Downloaded {arxiv_id} ({eprint.stat().st_size / 2**20:.1f} MiB) "
+                f"and extracted {len(files)} files "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+            return files
+        finally:
+            eprint.unlink(missing_ok=True)
+
+
+def extract_arxiv_source(
+    eprint: Path,
+    output_path: Path,
+    name: str = "main",
+    max_extracted_bytes: int = MAX_EXTRACTED_BYTES,
+    max_members: int = MAX_MEMBERS,
+) -> list[Path]:
+    """Extract only the files needed to render a paper from a downloaded
+    e-print, which is either a gzipped tarball or a single gzipped .tex file.
+
+    Parameters
+    ----------
+    eprint : Path
+        downloaded e-print
+    output_path : Path
+        directory where the files are extracted
+    name : str, optional
+        name of the .tex file of a paper which is not tarred, by default "main"
+    max_extracted_bytes : int, optional
+        upper bound of the total size of the extracted files, by default 512 MiB
+    max_members : int, optional
+        upper bound of the number of files in the tarball, by default 5000
+    Returns
+    -------
+    list[Path]
+        extracted files
+
+    Raises
+    ------
+    ValueError
+        if the e-print has no LaTeX source, or exceeds the limits
+    """
+    with open(eprint, "rb") as f:
+        magic = f.read(4)
+    if magic.startswith(b"%PDF"):
+        raise ValueError(f"arXiv paper has no LaTeX source: {name}")
+
+    try:
+        return _extract_tar(eprint, output_path, max_extracted_bytes, max_members)
+    except tarfile.ReadError:
+        # a paper of a single .tex file is not tarred
+        return [
+            _extract_single_file(
+                eprint, output_path / f"{name}.tex", max_extracted_bytes
+            )
+        ]
+
+
+def _download(url: str, path: Path, max_bytes: int, max_retries: int) -> None:
+    """Stream the URL into the file, resuming from where it stopped
+    with a Range request if the connection breaks."""
+    path.unlink(missing_ok=True)
+
+    for attempt in range(max_retries + 1):
+        received = path.stat().st_size if path.exists() else 0
+        headers = {"Range": f"bytes={received}-"} if received else {}
+        try:
+            with get_session().get(url, headers=headers, stream=True) as res:
+                if res.status_code == 416:
+                    # nothing is left to download
+                    return
+                res.raise_for_status()
+
+                if res.status_code != 206:
+                    # the server does not support ranges, so start over
+                    received = 0
+                expected = received + int(res.headers.get("Content-Length", 0))
+                if expected > max_bytes:
+                    raise ValueError(f"e-print is larger than {max_bytes} bytes: {url}")
+
+                with open(path, "ab" if received else "wb") as f:
+                    for chunk in res.iter_content(_CHUNK_SIZE):
+                        received += len(chunk)
+                        if received > max_bytes:
+                            raise ValueError(
+                                f"e-print is larger than {max_bytes} bytes: {url}"
+                            )
+                        f.write(chunk)
+
+            if received < expected:
+                raise requests.ConnectionError(f"Incomplete download: {url}")
+            return
+        except requests.RequestException as e:
+            retriable = not isinstance(e, requests.HTTPError) or (
+                e.response is not None and e.response.status_code >= 500
+            )
+            if not retriable or attempt == max_retries:
+                raise
+            logger.warning(f"Download interrupted, resuming ({e}): {url}")
+            metrics.retry()
+            time.sleep(2**attempt)
+
+
+def _extract_tar(
+    tarball: Path,
+    output_path: Path,
+    max_bytes: int,
+    max_members: int,
+) -> list[Path]:
+    """Extract the needed members of the tarball in a single pass over it."""
+    files, extracted = [], 0
+
+    # "r|*" reads the tarball as a stream, so that it is decompressed only once
+    with tarfile.open(tarball, mode="r|*") as tar:
+        for i, member in enumerate(tar):
+            if i >= max_members:
+                raise ValueError(f"e-print has more than {max_members} files")
+
+            name = PurePosixPath(member.name)
+            if (
+                not member.isfile()
+                or name.is_absolute()
+                or ".." in name.parts
+                or name.suffix.lower() not in SOURCE_SUFFIXES | FIGURE_SUFFIXES
+            ):
+                continue
+
+            extracted += member.size
+            if extracted > max_bytes:
+                raise ValueError(f"e-print is larger than {max_bytes} bytes extracted")
+
+            target = output_path.joinpath(*name.parts)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with tar.extractfile(member) as source, open(target, "wb") as f:
+                shutil.copyfileobj(source, f, _CHUNK_SIZE)
+            files.append(target)
+
+    return files
+
+
+def _extract_single_file(source: Path, target: Path, max_bytes: int) -> Path:
+    with open(source, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+
+    written = 0
+    with (gzip.open if gzipped else open)(source, "rb") as f, open(target, "wb") as out:
+        while chunk := f.read(_CHUNK_SIZE):
+            written += len(chunk)
+            if written > max_bytes:
+                raise ValueError(f"e-print is larger than {max_bytes} bytes extracted")
+            out.write(chunk)
+    return target
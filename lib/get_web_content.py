@@ -1,17 +1,27 @@
 from __future__ import annotations
 
-import json
-import os
 import re
-import subprocess
 from dataclasses import dataclass
 from pathlib import Path
 
-import arxiv
-import pdf2image
 from bs4 import BeautifulSoup
 from markdownify import markdownify
-from transformers import pipeline
+
+from .arxiv_metadata import (
+    ArxivMetadata,
+    ArxivMetadataService,
+    get_arxiv_metadata_service,
+    parse_arxiv_id,
+)
+from .download_arxiv_source import download_arxiv_source
+from .html_to_notion import html_to_notion
+from .kv_store import KeyValueStore
+from .metrics import metrics
+from .node_sidecar import markdown_to_notion
+from .page_cache import CachedPage, PageCache, extract_page, fetch_page
+from .render_engrafo import engrafo_renderer
+from .rasterize_figures import figure_rasterizer
+from .translate_text import translate_text
 
 
 @dataclass
@@ -19,26 +29,53 @@ class ProcessedContent:
     title: str
     url: str
     html_content: str
-    markdown_content: str
+    # None when the markdown was not needed to build the other contents
+    markdown_content: str | None
     notion_content: list
     cleansed_content: str
     tags: list[str] | None = None
+    # directory against which relative image paths in notion_content are resolved
+    resource_path: Path | None = None
+
+
+@dataclass
+class FetchedContent:
+    """What `fetch_web_content` got from the network for `extract_web_content`."""
+
+    url: str
+    workspace: Path
+    # readability input of a web page, None for arXiv
+    page: CachedPage | None = None
+    # metadata of an arXiv paper, None for a web page
+    info: ArxivMetadata | None = None
+    render_key: str | None = None
+    # whether the rendering of the arXiv paper was restored from the cache,
+    # otherwise its source has been downloaded into the workspace
+    restored: bool = False
 
 
 def get_web_content(
     url: str,
     cache_path: Path,
     arxiv_categories: dict[str, str],
+    workspace: Path | None = None,
+    notion_converter: str = "native",
+    page_cache: PageCache | None = None,
+    arxiv_metadata: ArxivMetadataService | None = None,
+    translation_cache: KeyValueStore | None = None,
 ) -> ProcessedContent:
     """Get web page of the URL & process it to 5 types of contents as follows:
     1. title of the web page
     2. url of the web page
     3. html-formatted one, which is extracted by readability
-    4. markdown-formatted one
+    4. markdown-formatted one, only when it is needed
     5. notion-compatible one
     6. cleansed one
     7. tags, which is given only when the URL is arXiv at the moment
 
+    This is `fetch_web_content` followed by `extract_web_content`, which
+    the pipeline runs separately so that fetching overlaps extracting.
+
     Parameters
     ----------
     url : str
@@ -48,54 +85,93 @@ def get_web_content(
     arxiv_categories : dict[str, str]
         Dictionary of arXiv categories.
         e.g. {"cs.AI": "artificial intelligence"}
+    workspace : Path | None, optional
+        Path to the directory under `cache_path` where the intermediate files
+        of this URL are written, by default None (`cache_path` itself)
+    notion_converter : str, optional
+        "native" to convert the HTML to notion blocks directly, or "martian"
+        to go through Markdown and martian, by default "native"
+    page_cache : PageCache | None, optional
+        cache of fetched pages and their readability results, by default None
+    arxiv_metadata : ArxivMetadataService | None, optional
+        service to look up arXiv papers, by default None (an in-memory one)
+    translation_cache : KeyValueStore | None, optional
+        cache of translated sentences of abstracts, by default None
     Returns
     -------
     ProcessedContent
         Processed content of the web page, explained above.
     """
-    if url.startswith("https://arxiv.org/"):
-        arxiv_id = url.split("/")[-1]
-        info = next(arxiv.Search(id_list=[arxiv_id]).results())
-        translator = pipeline("translation", model="staka/fugumt-en-ja")
-        translated_abstract = translator(info.summary)[0]["translation_text"]
-        del translator
-
-        subprocess.run(
-            ["/bin/bash", "scripts/arxiv-download.sh", arxiv_id, cache_path.absolute()],
-            timeout=100,
-        )
+    fetched = fetch_web_content(
+        url=url,
+        workspace=workspace if workspace is not None else cache_path,
+        page_cache=page_cache,
+        arxiv_metadata=arxiv_metadata,
+    )
+    return extract_web_content(
+        fetched=fetched,
+        arxiv_categories=arxiv_categories,
+        notion_converter=notion_converter,
+        page_cache=page_cache,
+        translation_cache=translation_cache,
+    )
+
 
-        for root, dirs, files in os.walk(top=cache_path.absolute()):
-            for file in files:
-                if file.endswith(".pdf"):
-                    path = Path(os.path.join(root, file))
-                    image = pdf2image.convert_from_path(path)
-                    image[0].save(path.with_suffix(".png"), "PNG")
-
-                if file.endswith(".tex"):
-                    path = Path(os.path.join(root, file))
-                    with open(path, "r") as f:
-                        text = f.read()
-
-                    if ".pdf" in text:
-                        # replace .pdf with .png and save
-                        text = text.replace(".pdf", ".png")
-                        with open(path, "w") as f:
-                            f.write(text)
-
-        subprocess.run(
-            [
-                "docker",
-                "exec",
-                "engrafo",
-                "engrafo",
-                "output/",
-                "output/",
-            ],
-            timeout=1000,
-            stdout=subprocess.DEVNULL,
+def fetch_web_content(
+    url: str,
+    workspace: Path,
+    page_cache: PageCache | None = None,
+    arxiv_metadata: ArxivMetadataService | None = None,
+) -> FetchedContent:
+    """Network-bound half of `get_web_content`: download the web page, or the
+    metadata and the source of the arXiv paper into the workspace."""
+    if not url.startswith("https://arxiv.org/"):
+        return FetchedContent(
+            url=url, workspace=workspace, page=fetch_page(url, page_cache)
         )
-        html = open("/home/workspace/notion-auto-archive/content/index.html").read()
+
+    arxiv_id, version = parse_arxiv_id(url)
+    if arxiv_metadata is None:
+        arxiv_metadata = get_arxiv_metadata_service()
+    info = arxiv_metadata.get(arxiv_id)
+
+    # the version tells whether the cached rendering is stale
+    version = version or info.version
+    render_key = f"{arxiv_id}{version}" if version else None
+
+    restored = engrafo_renderer.restore(render_key, workspace)
+    if not restored:
+        download_arxiv_source(f"{arxiv_id}{version}", workspace)
+
+    return FetchedContent(
+        url=url,
+        workspace=workspace,
+        info=info,
+        render_key=render_key,
+        restored=restored,
+    )
+
+
+def extract_web_content(
+    fetched: FetchedContent,
+    arxiv_categories: dict[str, str],
+    notion_converter: str = "native",
+    page_cache: PageCache | None = None,
+    translation_cache: KeyValueStore | None = None,
+) -> ProcessedContent:
+    """CPU-bound half of `get_web_content`: render, extract and convert
+    what `fetch_web_content` got."""
+    url, workspace, info = fetched.url, fetched.workspace, fetched.info
+
+    if info is not None:
+        translated_abstract = translate_text(info.summary, store=translation_cache)
+
+        if not fetched.restored:
+            figure_rasterizer.rasterize(workspace.absolute())
+
+            engrafo_renderer.render(workspace, key=fetched.render_key)
+
+        html = open(workspace / "index.html").read()
         soup = BeautifulSoup(html, "html.parser")
 
         figures = []
@@ -135,41 +211,30 @@ def get_web_content(
 
         title = info.title
     else:
-        subprocess.run(
-            ["node", "js/readable.js", url, cache_path.absolute() / "readable.json"]
-        )
-
-        with open(cache_path.absolute() / "readable.json", "r") as f:
-            ret = json.load(f)
+        ret = extract_page(fetched.page, workspace, page_cache=page_cache)
 
         title = ret["title"]
         html_content = ret["content"]
 
-    markdown_content = markdownify(
-        html_content, heading_style="ATX", escape_underscores=False
-    )
-    markdown_content = re.sub(
-        pattern=r"(\#\s\n)",
-        repl="# ",
-        string=markdown_content,
-    )
-
-    with open(cache_path.absolute() / "content.md", "w") as f:
-        f.write(markdown_content)
-
-    subprocess.run(
-        [
-            "node",
-            "js/markdown_to_notion.js",
-            cache_path.absolute() / "content.md",
-            cache_path.absolute() / "content.json",
-        ]
-    )
-
-    with open(cache_path.absolute() / "content.json", "r") as f:
-        notion_content = json.load(f)
+    # markdown is needed by martian, and to cleanse non-arXiv texts
+    markdown_content = None
+    if notion_converter == "martian" or info is None:
+        with metrics.span("markdownify") as span:
+            span.bytes = len(html_content.encode())
+            markdown_content = html_to_markdown(html_content)
+
+    if notion_converter == "martian":
+        with metrics.span("martian") as span:
+            span.bytes = len(markdown_content.encode())
+            notion_content = markdown_to_notion(markdown_content, workspace)
+            span.items = len(notion_content)
+    else:
+        with metrics.span("html_to_notion") as span:
+            span.bytes = len(html_content.encode())
+            notion_content = list(html_to_notion(html_content))
+            span.items = len(notion_content)
 
-    if url.startswith("https://arxiv.org/"):
+    if info is not None:
         cleansed_content = info.summary.replace("\n", " ")
         tags = [
             arxiv_categories[info.categories[i]] for i in range(len(info.categories))
@@ -186,9 +251,22 @@ def get_web_content(
         cleansed_content=cleansed_content,
         notion_content=notion_content,
         tags=tags,
+        resource_path=workspace,
     )
 
 
+def html_to_markdown(html: str) -> str:
+    """Convert HTML to Markdown with ATX headings."""
+    markdown = markdownify(html, heading_style="ATX", escape_underscores=False)
+    markdown = re.sub(
+        pattern=r"(\#\s\n)",
+        repl="# ",
+        string=markdown,
+    )
+
+    return markdown
+
+
 def cleansing_text_to_feed(text: str) -> str:
     # remove texts between | and | or - and -, but \n is between them, do not remove
     text = re.sub(
@@ -0,0 +1,376 @@
+from __future__ import annotations
+
+import re
+from typing import Iterable, Iterator
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4.element import PageElement, PreformattedString
+
+# Notion rejects a text object longer than this
+MAX_TEXT_LENGTH = 2000
+
+HEADINGS = {"h1": "heading_1", "h2": "heading_2", "h3": "heading_3"}
+HEADINGS.update({f"h{i}": "heading_3" for i in range(4, 7)})
+BOLD_TAGS = {"b", "strong"}
+ITALIC_TAGS = {"i", "em", "cite"}
+STRIKETHROUGH_TAGS = {"s", "del", "strike"}
+CODE_TAGS = {"code", "kbd", "samp", "tt"}
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "button", "form"}
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "body", "dd", "details", "div",
+    "dl", "dt", "fieldset", "figcaption", "figure", "footer", "h1", "h2", "h3",
+    "h4", "h5", "h6", "header", "hr", "html", "li", "main", "nav", "ol", "p",
+    "pre", "section", "summary", "table", "ul",
+}  # fmt: skip
+# languages of code blocks which Notion accepts, by the names used in class="language-*"
+CODE_LANGUAGES = {
+    "bash": "bash", "c": "c", "cpp": "c++", "c++": "c++", "csharp": "c#",
+    "css": "css", "diff": "diff", "docker": "docker", "dockerfile": "docker",
+    "go": "go", "html": "html", "java": "java", "javascript": "javascript",
+    "js": "javascript", "json": "json", "kotlin": "kotlin", "latex": "latex",
+    "makefile": "makefile", "markdown": "markdown", "md": "markdown",
+    "php": "php", "python": "python", "py": "python", "r": "r", "ruby": "ruby",
+    "rust": "rust", "scala": "scala", "sh": "shell", "shell": "shell",
+    "sql": "sql", "swift": "swift", "toml": "toml", "ts": "typescript",
+    "typescript": "typescript", "xml": "xml", "yaml": "yaml", "yml": "yaml",
+}  # fmt: skip
+
+_BREAK = ("break", None)
+
+
+def html_to_notion(html: str) -> Iterator[dict]:
+    """Convert HTML (e.g. the output of readability) to notion blocks directly,
+    producing the same kind of blocks as markdownify + martian, without the
+    Markdown round trip.
+
+    Parameters
+    ----------
+    html : str
+        HTML to convert
+
+    Yields
+    ------
+    dict
+        notion blocks, in document order
+    """
+    soup = BeautifulSoup(html, "html.parser")
+
+    yield from _paragraphs(_walk(soup, _annotations()))
+
+
+def _annotations(**kwargs) -> dict:
+    annotations = {
+        "bold": False,
+        "strikethrough": False,
+        "underline": False,
+        "italic": False,
+        "code": False,
+        "color": "default",
+    }
+    annotations.update(kwargs)
+    return annotations
+
+
+def _rich_text(content: str, annotations: dict, link: str | None = None) -> dict:
+    text = {"content": content}
+    if link is not None:
+        text["link"] = {"type": "url", "url": link}
+    return {"type": "text", "annotations": dict(annotations), "text": text}
+
+
+def _walk(
+    node: Tag,
+    annotations: dict,
+    link: str | None = None,
+    flatten: bool = False,
+) -> Iterator[tuple[str, dict | None]]:
+    """Yield ("text", rich_text) for inline content, ("block", block) for
+    block-level content, and ("break", None) where a paragraph must end.
+    If `flatten` is True, block-level elements are not converted to blocks
+    but only break the text, e.g. for paragraphs in a quote or a list item."""
+    yield from _walk_nodes(node.children, annotations, link, flatten)
+
+
+def _walk_nodes(
+    nodes: Iterable[PageElement],
+    annotations: dict,
+    link: str | None = None,
+    flatten: bool = False,
+) -> Iterator[tuple[str, dict | None]]:
+    for child in nodes:
+        # comments, doctypes, CDATA, processing instructions, etc.
+        if isinstance(child, PreformattedString):
+            continue
+
+        if isinstance(child, NavigableString):
+            text = re.sub(r"\s+", " ", str(child))
+            if text:
+                yield "text", _rich_text(text, annotations, link)
+            continue
+
+        if not isinstance(child, Tag) or child.name in SKIPPED_TAGS:
+            continue
+
+        name = child.name
+
+        if name in BLOCK_TAGS and flatten:
+            yield _BREAK
+            yield from _walk(child, annotations, link, flatten)
+            yield _BREAK
+        elif name in BLOCK_TAGS:
+            yield _BREAK
+            for block in _block(child, annotations):
+                yield "block", block
+            yield _BREAK
+        elif name == "img":
+            if child.get("src"):
+                yield "block", _image(child["src"])
+        elif name == "br":
+            yield "text", _rich_text("\n", annotations, link)
+        elif name == "a":
+            href = child.get("href") or None
+            yield from _walk(child, annotations, href or link, flatten)
+        elif name in BOLD_TAGS:
+            yield from _walk(child, {**annotations, "bold": True}, link, flatten)
+        elif name in ITALIC_TAGS:
+            yield from _walk(child, {**annotations, "italic": True}, link, flatten)
+        elif name in STRIKETHROUGH_TAGS:
+            yield from _walk(
+                child, {**annotations, "strikethrough": True}, link, flatten
+            )
+        elif name in CODE_TAGS:
+            yield from _walk(child, {**annotations, "code": True}, link, flatten)
+        else:
+            yield from _walk(child, annotations, link, flatten)
+
+
+def _block(node: Tag, annotations: dict) -> Iterator[dict]:
+    name = node.name
+
+    if name in HEADINGS:
+        rich_text, blocks = _collect(_walk(node, annotations, flatten=True))
+        if rich_text:
+            yield _text_block(HEADINGS[name], rich_text)
+        yield from blocks
+    elif name in ("ul", "ol"):
+        yield from _list(node, annotations)
+    elif name == "pre":
+        yield _code(node)
+    elif name == "blockquote":
+        # as martian does, the paragraphs are children of a quote whose own
+        # text is empty, which Notion shows without a placeholder
+        block = _text_block("quote", [_rich_text("", _annotations())])
+        block["quote"]["children"] = list(_paragraphs(_walk(node, annotations)))
+        yield block
+    elif name == "hr":
+        yield {"object": "block", "type": "divider", "divider": {}}
+    elif name == "table":
+        table = _table(node, annotations)
+        if table is not None:
+            yield table
+    elif name == "li":
+        # a list item outside of a list
+        yield from _list_item(node, "bulleted_list_item", annotations)
+    else:
+        yield from _paragraphs(_walk(node, annotations))
+
+
+def _paragraphs(items: Iterator[tuple[str, dict | None]]) -> Iterator[dict]:
+    """Group consecutive inline items into paragraphs, passing blocks through."""
+    buffer = []
+    for kind, item in items:
+        if kind == "text":
+            buffer.append(item)
+            continue
+
+        rich_text = _normalize(buffer)
+        if rich_text:
+            yield _text_block("paragraph", rich_text)
+        buffer = []
+
+        if kind == "block":
+            yield item
+
+    rich_text = _normalize(buffer)
+    if rich_text:
+        yield _text_block("paragraph", rich_text)
+
+
+def _collect(
+    items: Iterator[tuple[str, dict | None]],
+) -> tuple[list[dict], list[dict]]:
+    """Collect inline items into one rich_text, separating paragraphs with
+    a space, and return nested blocks separately."""
+    rich_text, blocks, paragraphs = [], [], [[]]
+    for kind, item in items:
+        if kind == "text":
+            paragraphs[-1].append(item)
+        elif kind == "break":
+            paragraphs.append([])
+        else:
+            blocks.append(item)
+
+    for paragraph in filter(None, map(_normalize, paragraphs)):
+        if rich_text:
+            rich_text.append(_rich_text(" ", _annotations()))
+        rich_text.extend(paragraph)
+
+    return _merge(rich_text), blocks
+
+
+def _list(node: Tag, annotations: dict) -> Iterator[dict]:
+    block_type = "numbered_list_item" if node.name == "ol" else "bulleted_list_item"
+    for child in node.find_all("li", recursive=False):
+        yield from _list_item(child, block_type, annotations)
+
+
+def _list_item(node: Tag, block_type: str, annotations: dict) -> Iterator[dict]:
+    nested, others = [], []
+    for child in node.children:
+        if isinstance(child, Tag) and child.name in ("ul", "ol"):
+            nested.append(child)
+        else:
+            others.append(child)
+
+    paragraphs, children = [[]], []
+    for kind, item in _walk_nodes(others, annotations, flatten=True):
+        if kind == "text":
+            paragraphs[-1].append(item)
+        elif kind == "break":
+            paragraphs.append([])
+        else:
+            children.append(item)
+
+    paragraphs = list(filter(None, map(_normalize, paragraphs)))
+    rich_text = paragraphs[0] if paragraphs else []
+    # following paragraphs of a loose list item become its children
+    children = [_text_block("paragraph", p) for p in paragraphs[1:]] + children
+    for child in nested:
+        children.extend(_list(child, annotations))
+
+    block = _text_block(block_type, rich_text)
+    if children:
+        block[block_type]["children"] = children
+    yield block
+
+
+def _code(node: Tag) -> dict:
+    code = node.find("code") or node
+    classes = (code.get("class") or []) + (node.get("class") or [])
+
+    language = "plain text"
+    for cls in classes:
+        name = re.sub(r"^(language|lang|highlight-source)-", "", cls).lower()
+        if name in CODE_LANGUAGES:
+            language = CODE_LANGUAGES[name]
+            break
+
+    text = code.get_text().rstrip("\n")
+    rich_text = [
+        _rich_text(text[i : i + MAX_TEXT_LENGTH], _annotations())
+        for i in range(0, len(text), MAX_TEXT_LENGTH)
+    ]
+
+    return {
+        "object": "block",
+        "type": "code",
+        "code": {"rich_text": rich_text, "language": language},
+    }
+
+
+def _table(node: Tag, annotations: dict) -> dict | None:
+    rows = [tr for tr in node.find_all("tr") if tr.find_parent("table") is node]
+    if not rows:
+        return None
+
+    cells = [
+        [
+            _collect(_walk(cell, annotations, flatten=True))[0]
+            for cell in row.find_all(["td", "th"], recursive=False)
+        ]
+        for row in rows
+    ]
+    width = max(len(row) for row in cells)
+    if width == 0:
+        return None
+
+    return {
+        "object": "block",
+        "type": "table",
+        "table": {
+            "table_width": width,
+            "has_column_header": rows[0].find("th") is not None,
+            "has_row_header": False,
+            "children": [
+                {
+                    "type": "table_row",
+                    "table_row": {"cells": row + [[]] * (width - len(row))},
+                }
+                for row in cells
+            ],
+        },
+    }
+
+
+def _image(url: str) -> dict:
+    return {
+        "object": "block",
+        "type": "image",
+        "image": {"type": "external", "external": {"url": url}},
+    }
+
+
+def _text_block(block_type: str, rich_text: list[dict]) -> dict:
+    return {
+        "object": "block",
+        "type": block_type,
+        block_type: {"rich_text": rich_text},
+    }
+
+
+def _normalize(rich_text: list[dict]) -> list[dict]:
+    """Strip the whitespace around a paragraph, merge runs of the same style
+    and split texts longer than Notion accepts."""
+    rich_text = _merge(rich_text)
+
+    while rich_text:
+        content = rich_text[0]["text"]["content"].lstrip(" ")
+        if content:
+            rich_text[0]["text"]["content"] = content
+            break
+        rich_text.pop(0)
+
+    while rich_text:
+        content = rich_text[-1]["text"]["content"].rstrip(" ")
+        if content:
+            rich_text[-1]["text"]["content"] = content
+            break
+        rich_text.pop()
+
+    normalized = []
+    for item in rich_text:
+        content = item["text"]["content"]
+        for i in range(0, len(content), MAX_TEXT_LENGTH):
+            text = {**item["text"], "content": content[i : i + MAX_TEXT_LENGTH]}
+            normalized.append({**item, "text": text})
+
+    return normalized
+
+
+def _merge(rich_text: list[dict]) -> list[dict]:
+    merged = []
+    for item in rich_text:
+        if (
+            merged
+            and merged[-1]["annotations"] == item["annotations"]
+            and merged[-1]["text"].get("link") == item["text"].get("link")
+        ):
+            content = merged[-1]["text"]["content"] + item["text"]["content"]
+            # collapse the spaces between adjacent inline elements
+            content = re.sub(r" {2,}", " ", content)
+            text = {**merged[-1]["text"], "content": content}
+            merged[-1] = {**merged[-1], "text": text}
+        else:
+            merged.append(item)
+
+    return merged
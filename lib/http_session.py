@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from notion_client import Client
+from requests.adapters import HTTPAdapter
+
+_settings = {
+    "connect_timeout": 10.0,
+    "read_timeout": 60.0,
+    "pool_connections": 16,
+    "pool_maxsize": 8,
+}
+_lock = threading.Lock()
+_session: requests.Session | None = None
+_httpx_client: httpx.Client | None = None
+# connection pool shared by the httpx clients
+_httpx_transport: httpx.HTTPTransport | None = None
+_notion_clients: dict[str, Client] = {}
+# new connections and requests per host, counted for the httpx client
+_httpx_connections: Counter = Counter()
+_httpx_requests: Counter = Counter()
+
+
+class _TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter which applies the default timeouts unless given explicitly."""
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = (
+                _settings["connect_timeout"],
+                _settings["read_timeout"],
+            )
+        return super().send(request, **kwargs)
+
+
+def configure_http(
+    connect_timeout: float = 10.0,
+    read_timeout: float = 60.0,
+    pool_connections: int = 16,
+    pool_maxsize: int = 8,
+) -> None:
+    """Change the timeouts and the pool sizes of the shared HTTP clients.
+    Clients which are already created are recreated on next use.
+
+    Parameters
+    ----------
+    connect_timeout : float, optional
+        seconds to wait for a connection, by default 10.0
+    read_timeout : float, optional
+        seconds to wait for data from the server, by default 60.0
+    pool_connections : int, optional
+        number of hosts whose connections are kept, by default 16
+    pool_maxsize : int, optional
+        number of connections kept per host, by default 8
+    """
+    global _session, _httpx_client, _httpx_transport
+
+    with _lock:
+        _settings.update(
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+        )
+        if _session is not None:
+            _session.close()
+        if _httpx_client is not None:
+            _httpx_client.close()
+        for notion in _notion_clients.values():
+            notion.client.close()
+        if _httpx_transport is not None:
+            _httpx_transport.close()
+        _session, _httpx_client, _httpx_transport = None, None, None
+        _notion_clients.clear()
+
+
+def get_session() -> requests.Session:
+    """Get the requests.Session shared by the whole process, which keeps
+    connections alive per host and applies the default timeouts."""
+    global _session
+
+    with _lock:
+        if _session is None:
+            adapter = _TimeoutHTTPAdapter(
+                pool_connections=_settings["pool_connections"],
+                pool_maxsize=_settings["pool_maxsize"],
+            )
+            _session = requests.Session()
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def get_httpx_client() -> httpx.Client:
+    """Get the httpx.Client shared by the whole process."""
+    global _httpx_client
+
+    with _lock:
+        if _httpx_client is None:
+            _httpx_client = _new_httpx_client()
+        return _httpx_client
+
+
+def get_notion_client(auth: str) -> Client:
+    """Get the notion client of the token. Each token has an httpx client of
+    its own, since notion-client sets its base URL and headers on it, but
+    they share the connection pool and the timeouts of the other clients."""
+    with _lock:
+        if auth not in _notion_clients:
+            notion = Client(auth=auth, client=_new_httpx_client())
+            # notion-client overwrites the timeout with a flat one of its own
+            notion.client.timeout = _httpx_timeout()
+            _notion_clients[auth] = notion
+        return _notion_clients[auth]
+
+
+def pool_stats() -> dict[str, dict[str, float]]:
+    """Statistics of the shared connection pools per host.
+
+    Returns
+    -------
+    dict[str, dict[str, float]]
+        for each "scheme://host:port", the number of opened connections,
+        the number of requests, and the ratio of requests which reused
+        a kept-alive connection
+    """
+    connections, requests_ = Counter(), Counter()
+
+    with _lock:
+        session = _session
+    if session is not None:
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host = f"{key.key_scheme}://{key.key_host}:{key.key_port}"
+                connections[host] += pool.num_connections
+                requests_[host] += pool.num_requests
+
+    connections.update(_httpx_connections)
+    requests_.update(_httpx_requests)
+
+    return {
+        host: {
+            "connections": connections[host],
+            "requests": requests_[host],
+            "reuse_rate": 1 - connections[host] / requests_[host]
+            if requests_[host]
+            else 0.0,
+        }
+        for host in requests_
+    }
+
+
+def _new_httpx_client() -> httpx.Client:
+    # called with _lock held
+    global _httpx_transport
+
+    if _httpx_transport is None:
+        _httpx_transport = httpx.HTTPTransport(
+            limits=httpx.Limits(
+                max_connections=_settings["pool_connections"]
+                * _settings["pool_maxsize"],
+                max_keepalive_connections=_settings["pool_maxsize"],
+            )
+        )
+    return httpx.Client(
+        timeout=_httpx_timeout(),
+        transport=_httpx_transport,
+        event_hooks={"request": [_trace_httpx_request]},
+    )
+
+
+def _httpx_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        _settings["read_timeout"], connect=_settings["connect_timeout"]
+    )
+
+
+def _trace_httpx_request(request: httpx.Request) -> None:
+    url = urlsplit(str(request.url))
+    port = url.port or (443 if url.scheme == "https" else 80)
+    host = f"{url.scheme}://{url.hostname}:{port}"
+    _httpx_requests[host] += 1
+
+    def trace(event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            _httpx_connections[host] += 1
+
+    request.extensions["trace"] = trace
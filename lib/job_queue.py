@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from logging import getLogger
+from pathlib import Path
+from typing import Iterator
+
+logger = getLogger(__name__)
+
+# states of a job: waiting (possibly for a retry), being processed, finished,
+# and given up after `max_attempts` failures
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+DEAD = "dead"
+
+
+@dataclass
+class Job:
+    id: int
+    url: str
+    attempts: int
+
+
+class JobQueue:
+    """Persistent queue of URLs to archive, backed by SQLite.
+
+    A failed job is retried with exponential backoff, and moved to the
+    dead-letter state after `max_attempts` attempts. Jobs left running by
+    a process which died are made pending again by `recover`.
+
+    Parameters
+    ----------
+    path : str | Path
+        path to the SQLite database file. ":memory:" keeps the queue in memory.
+    max_attempts : int, optional
+        number of attempts before a job is dead, by default 5
+    retry_delay : float, optional
+        seconds before the first retry, doubled at each retry, by default 60
+    max_retry_delay : float, optional
+        upper bound of the seconds before a retry, by default 6 hours
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_attempts: int = 5,
+        retry_delay: float = 60,
+        max_retry_delay: float = 6 * 3600,
+    ) -> None:
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL UNIQUE, "
+                "state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_run_at REAL NOT NULL, last_error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_state_next_run_at "
+                "ON jobs (state, next_run_at)"
+            )
+
+    def enqueue(self, urls: list[str]) -> int:
+        """Add jobs of the URLs, ignoring the ones which are already queued.
+
+        Returns
+        -------
+        int
+            number of jobs added
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs "
+                "(url, state, next_run_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(url, PENDING, now, now, now) for url in urls],
+            )
+            return self._conn.total_changes - before
+
+    def claim(self) -> Job | None:
+        """Take the oldest job which is due, and mark it running."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id, url, attempts FROM jobs "
+                "WHERE state = ? AND next_run_at <= ? ORDER BY next_run_at, id LIMIT 1",
+                (PENDING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ?",
+                (RUNNING, now, row[0]),
+            )
+        return Job(id=row[0], url=row[1], attempts=row[2] + 1)
+
+    def complete(self, job: Job) -> None:
+        self._update(job, DONE)
+
+    def fail(self, job: Job, error: BaseException | str) -> None:
+        """Schedule a retry of the job, or move it to the dead-letter state."""
+        if job.attempts >= self.max_attempts:
+            logger.error(f"Giving up after {job.attempts} attempts: {job.url}")
+            self._update(job, DEAD, error=error)
+            return
+
+        delay = min(self.retry_delay * 2 ** (job.attempts - 1), self.max_retry_delay)
+        logger.warning(f"Retrying in {delay:.0f}s ({job.attempts} attempts): {job.url}")
+        self._update(job, PENDING, error=error, next_run_at=time.time() + delay)
+
+    def recover(self) -> int:
+        """Make the jobs left running by a previous process pending again.
+        Call it once at startup, before any worker starts.
+
+        Returns
+        -------
+        int
+            number of recovered jobs
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE jobs SET state = ?, next_run_at = ?, updated_at = ? "
+                "WHERE state = ?",
+                (PENDING, now, now, RUNNING),
+            ).rowcount
+
+    def retry_dead(self) -> int:
+        """Give the dead jobs another round of attempts."""
+        now = time.time()
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, next_run_at = ?, "
+                "updated_at = ? WHERE state = ?",
+                (PENDING, now, now, DEAD),
+            ).rowcount
+
+    def stats(self) -> dict[str, int]:
+        """Number of jobs in each state."""
+        with self._lock:
+            counts = dict(
+                self._conn.execute(
+                    "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+                ).fetchall()
+            )
+        return {state: counts.get(state, 0) for state in (PENDING, RUNNING, DONE, DEAD)}
+
+    def _update(
+        self,
+        job: Job,
+        state: str,
+        error: BaseException | str | None = None,
+        next_run_at: float | None = None,
+    ) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, last_error = ?, "
+                "next_run_at = COALESCE(?, next_run_at), updated_at = ? WHERE id = ?",
+                (
+                    state,
+                    None if error is None else repr(error),
+                    next_run_at,
+                    now,
+                    job.id,
+                ),
+            )
+
+
+def iter_jobs(
+    queue: JobQueue,
+    poll_interval: float = 5.0,
+    stop: threading.Event | None = None,
+) -> Iterator[Job]:
+    """Claim the jobs of the queue one by one as they become due, waiting
+    while there is none, until `stop` is set. Each job has to be passed to
+    `complete` or `fail` once it is processed.
+
+    Parameters
+    ----------
+    queue : JobQueue
+        queue to drain
+    poll_interval : float, optional
+        seconds to wait when there is no job due, by default 5.0
+    stop : threading.Event | None, optional
+        event which ends the iteration when it is set, by default None
+    Yields
+    ------
+    Job
+        claimed job
+    """
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        job = queue.claim()
+        if job is None:
+            stop.wait(poll_interval)
+        else:
+            yield job
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+
+class KeyValueStore:
+    """Small persistent string-to-string store backed by SQLite,
+    which can be shared between threads.
+
+    Parameters
+    ----------
+    path : str | Path
+        path to the SQLite database file. ":memory:" keeps the store in memory.
+    table : str, optional
+        name of the table, so that several stores can live in a file, by default "kv"
+    """
+
+    def __init__(self, path: str | Path, table: str = "kv") -> None:
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+
+    def get(self, key: str, default: str | None = None) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        return default if row is None else row[0]
+
+    def get_many(self, keys: list[str]) -> dict[str, str]:
+        """Get the values of the keys which are in the store."""
+        found = {}
+        with self._lock:
+            # stay under SQLite's limit of the number of host parameters
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                found.update(
+                    self._conn.execute(
+                        f"SELECT key, value FROM {self.table} "
+                        f"WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                )
+        return found
+
+    def set(self, key: str, value: str) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, items: dict[str, str]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)",
+                list(items.items()),
+            )
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[
+                0
+            ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@lru_cache(maxsize=None)
+def get_store(path: str | Path, table: str = "kv") -> KeyValueStore:
+    """Get the store of the path & table, which is opened once per process."""
+    return KeyValueStore(path, table=table)
@@ -1,7 +1,19 @@
+from __future__ import annotations
+
+import time
 import warnings
 
-import pandas as pd
-from transformers import pipeline
+import numpy as np
+
+from .metrics import metrics
+from .model_registry import model_registry
+
+CLASSIFIER_MODEL = "MoritzLaurer/mDeBERTa-v3-base-mnli-xnli"
+HYPOTHESIS_TEMPLATE = "This text is about {}."
+EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+# embeddings of the candidate labels, which are computed once per process
+_label_embeddings: dict[str, np.ndarray] = {}
 
 # Suppress the warning of transformers
 warnings.simplefilter("ignore", UserWarning)
@@ -11,6 +23,7 @@ def label_text(
     text: str,
     candidate_labels: list[str],
     threshold: float = 0.9,
+    prefilter_top_k: int | None = None,
 ) -> list[str]:
     """Label the text with the candidate labels, using the zero-shot-classification model.
 
@@ -23,40 +36,333 @@ def label_text(
     threshold : float, optional
         threshold to filter the labels whether the score is higher
         than the threshold or not, by default 0.9
+    prefilter_top_k : int | None, optional
+        if given, only the `prefilter_top_k` labels closest to the text in the
+        sentence-embedding space are scored by the zero-shot-classification
+        model, by default None (all labels are scored)
     Returns
     -------
     list[str]
         list of labels
     """
+    if prefilter_top_k is not None:
+        return label_texts(
+            [text],
+            candidate_labels,
+            threshold=threshold,
+            prefilter_top_k=prefilter_top_k,
+        )[0]
 
-    res = classify_text(text, candidate_labels)
+    with metrics.span("classification") as span:
+        span.items = 1
+        res = classify_text(text, candidate_labels)
 
-    res = pd.DataFrame({"labels": res["labels"], "scores": res["scores"]})
-    labels = res[res["scores"] > threshold].sort_values(by="scores", ascending=False)
+    return select_labels(res["labels"], res["scores"], threshold=threshold)
 
-    while len(labels) == 0:
-        threshold -= 0.05
-        labels = res[res["scores"] > threshold].sort_values(
-            by="scores", ascending=False
-        )
 
-    if len(labels) > 5:
-        labels = labels[:5]
+def label_texts(
+    texts: list[str],
+    candidate_labels: list[str],
+    threshold: float = 0.9,
+    batch_size: int = 16,
+    prefilter_top_k: int | None = None,
+) -> list[list[str]]:
+    """Label many texts at once with the candidate labels.
+    The tags of each text are the same as those given by `label_text`,
+    but premise/hypothesis pairs of all texts are fed to the model in
+    padded batches, which is much faster than labeling texts one by one.
 
-    return labels["labels"].tolist()
+    Parameters
+    ----------
+    texts : list[str]
+        texts to be labeled
+    candidate_labels : list[str]
+        candidate labels, which is given at 'config/config.py'
+    threshold : float, optional
+        threshold to filter the labels whether the score is higher
+        than the threshold or not, by default 0.9
+    batch_size : int, optional
+        number of premise/hypothesis pairs in a forward pass, by default 16
+    prefilter_top_k : int | None, optional
+        if given, only the `prefilter_top_k` labels closest to each text in the
+        sentence-embedding space are scored by the zero-shot-classification
+        model, by default None (all labels are scored)
+    Returns
+    -------
+    list[list[str]]
+        list of labels of each text
+    """
+    if not texts:
+        return []
+
+    with metrics.span("classification") as span:
+        span.items = len(texts)
+        if prefilter_top_k is not None and prefilter_top_k < len(candidate_labels):
+            shortlists = prefilter_labels(
+                texts, candidate_labels, top_k=prefilter_top_k
+            )
+            scores = classify_texts(
+                texts, candidate_labels, batch_size=batch_size, shortlists=shortlists
+            )
+        else:
+            scores = classify_texts(texts, candidate_labels, batch_size=batch_size)
+
+    return select_labels(candidate_labels, scores, threshold=threshold)
+
+
+def select_labels(
+    labels: list[str],
+    scores: np.ndarray | list[float],
+    threshold: float = 0.9,
+    max_labels: int = 5,
+    step: float = 0.05,
+) -> list[str] | list[list[str]]:
+    """Select at most `max_labels` labels whose scores are higher than the
+    threshold, in descending order of the scores. If there is no such label,
+    the threshold is lowered by `step` until any label passes it.
+
+    Parameters
+    ----------
+    labels : list[str]
+        labels corresponding to the last axis of the scores
+    scores : np.ndarray | list[float]
+        scores of a document of shape (n_labels,), or of documents
+        of shape (n_documents, n_labels)
+    threshold : float, optional
+        threshold of the scores, by default 0.9
+    max_labels : int, optional
+        maximum number of labels of a document, by default 5
+    step : float, optional
+        amount by which the threshold is lowered, by default 0.05
+    Returns
+    -------
+    list[str] | list[list[str]]
+        selected labels, or selected labels of each document if the scores are 2D
+    """
+    scores = np.asarray(scores, dtype=float)
+    single = scores.ndim == 1
+    scores = np.atleast_2d(scores)
+
+    if scores.shape[1] == 0:
+        return [] if single else [[] for _ in range(len(scores))]
+
+    # lowering the threshold by `step` until the best score passes it is
+    # the same as jumping to the first multiple of `step` below the best score
+    best = scores.max(axis=1)
+    thresholds = np.where(
+        best > threshold,
+        threshold,
+        threshold - (np.floor((threshold - best) / step) + 1) * step,
+    )
+    passed = scores > thresholds[:, None]
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :max_labels]
+
+    labels = np.asarray(labels, dtype=object)
+    selected = [labels[row[passed[i, row]]].tolist() for i, row in enumerate(order)]
+
+    return selected[0] if single else selected
 
 
 def classify_text(text: str, candidate_labels: list[str]) -> dict:
-    classifier = pipeline(
+    classifier = model_registry.get_pipeline(
         "zero-shot-classification",
-        model="MoritzLaurer/mDeBERTa-v3-base-mnli-xnli",
+        model=CLASSIFIER_MODEL,
     )
 
     result = classifier(
         text,
         candidate_labels,
         multi_label=True,
-        hypothesis_template="This text is about {}.",
+        hypothesis_template=HYPOTHESIS_TEMPLATE,
     )
-    
+
     return result
+
+
+def classify_texts(
+    texts: list[str],
+    candidate_labels: list[str],
+    batch_size: int = 16,
+    shortlists: list[list[int]] | None = None,
+) -> np.ndarray:
+    """Compute the entailment score of every (text, label) pair in padded batches.
+
+    Parameters
+    ----------
+    texts : list[str]
+        texts to be classified
+    candidate_labels : list[str]
+        candidate labels
+    batch_size : int, optional
+        number of premise/hypothesis pairs in a forward pass, by default 16
+    shortlists : list[list[int]] | None, optional
+        indices of the labels to be scored for each text. The scores of the
+        other labels are -inf, so that they are never selected.
+        By default None (all labels are scored)
+    Returns
+    -------
+    np.ndarray
+        scores of shape (len(texts), len(candidate_labels)), in the same
+        order as the arguments. Each score is computed in the same way as
+        the zero-shot-classification pipeline with multi_label=True.
+    """
+    import torch
+
+    classifier = model_registry.get_pipeline(
+        "zero-shot-classification",
+        model=CLASSIFIER_MODEL,
+    )
+    tokenizer, model = classifier.tokenizer, classifier.model
+
+    entailment_id = classifier.entailment_id
+    contradiction_id = -1 if entailment_id == 0 else 0
+
+    if shortlists is None:
+        shortlists = [list(range(len(candidate_labels)))] * len(texts)
+
+    hypotheses = [HYPOTHESIS_TEMPLATE.format(label) for label in candidate_labels]
+    rows = [i for i, shortlist in enumerate(shortlists) for _ in shortlist]
+    cols = [j for shortlist in shortlists for j in shortlist]
+    pairs = [(texts[i], hypotheses[j]) for i, j in zip(rows, cols)]
+
+    logits = []
+    with torch.inference_mode():
+        for i in range(0, len(pairs), batch_size):
+            premises, batch_hypotheses = zip(*pairs[i : i + batch_size])
+            inputs = tokenizer(
+                list(premises),
+                list(batch_hypotheses),
+                padding=True,
+                truncation="only_first",
+                return_tensors="pt",
+            ).to(model.device)
+            logits.append(model(**inputs).logits.float().cpu().numpy())
+
+    scores = np.full((len(texts), len(candidate_labels)), -np.inf)
+    if not logits:
+        return scores
+
+    logits = np.concatenate(logits)[:, [contradiction_id, entailment_id]]
+    probs = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    scores[rows, cols] = probs[:, 1] / probs.sum(axis=-1)
+
+    return scores
+
+
+def prefilter_labels(
+    texts: list[str],
+    candidate_labels: list[str],
+    top_k: int,
+) -> list[list[int]]:
+    """Shortlist the candidate labels of each text with a sentence-embedding model,
+    which is much cheaper than scoring every label with the NLI model.
+    Embeddings of the labels are computed once and cached in the process.
+
+    Parameters
+    ----------
+    texts : list[str]
+        texts to be labeled
+    candidate_labels : list[str]
+        candidate labels
+    top_k : int
+        number of labels to keep for each text
+    Returns
+    -------
+    list[list[int]]
+        indices of the `top_k` labels most similar to each text, in
+        descending order of the cosine similarity
+    """
+    missing = [label for label in candidate_labels if label not in _label_embeddings]
+    if missing:
+        for label, embedding in zip(missing, embed_texts(missing)):
+            _label_embeddings[label] = embedding
+
+    label_embeddings = np.stack(
+        [_label_embeddings[label] for label in candidate_labels]
+    )
+    similarities = embed_texts(texts) @ label_embeddings.T
+    top_k = min(top_k, len(candidate_labels))
+
+    return np.argsort(-similarities, axis=1, kind="stable")[:, :top_k].tolist()
+
+
+def embed_texts(texts: list[str], batch_size: int = 32) -> np.ndarray:
+    """Embed the texts with the sentence-embedding model (mean pooling).
+
+    Returns
+    -------
+    np.ndarray
+        L2-normalized embeddings of shape (len(texts), hidden_size)
+    """
+    import torch
+
+    extractor = model_registry.get_pipeline("feature-extraction", model=EMBEDDING_MODEL)
+    tokenizer, model = extractor.tokenizer, extractor.model
+
+    embeddings = []
+    with torch.inference_mode():
+        for i in range(0, len(texts), batch_size):
+            inputs = tokenizer(
+                texts[i : i + batch_size],
+                padding=True,
+                truncation=True,
+                return_tensors="pt",
+            ).to(model.device)
+            hidden = model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            embeddings.append(pooled.float().cpu().numpy())
+
+    embeddings = np.concatenate(embeddings)
+
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True).clip(1e-12)
+
+
+def compare_prefilter(
+    texts: list[str],
+    candidate_labels: list[str],
+    top_k: int,
+    threshold: float = 0.9,
+    batch_size: int = 16,
+) -> dict:
+    """Label the texts with and without the embedding prefilter and report
+    how well they agree, which helps to tune `top_k`.
+
+    Returns
+    -------
+    dict
+        - top_k: the given top_k
+        - exact_match: ratio of texts whose tags are exactly the same
+        - jaccard: mean Jaccard similarity of the tags
+        - shortlist_recall: ratio of the tags given by the full NLI that
+          survive the prefilter
+        - seconds_full / seconds_prefiltered: time taken by each method
+    """
+    started = time.perf_counter()
+    full = label_texts(texts, candidate_labels, threshold, batch_size)
+    seconds_full = time.perf_counter() - started
+
+    started = time.perf_counter()
+    shortlists = prefilter_labels(texts, candidate_labels, top_k=top_k)
+    scores = classify_texts(
+        texts, candidate_labels, batch_size=batch_size, shortlists=shortlists
+    )
+    prefiltered = select_labels(candidate_labels, scores, threshold=threshold)
+    seconds_prefiltered = time.perf_counter() - started
+
+    jaccards, hits, total = [], 0, 0
+    for tags, tags_prefiltered, shortlist in zip(full, prefiltered, shortlists):
+        union = set(tags) | set(tags_prefiltered)
+        jaccards.append(len(set(tags) & set(tags_prefiltered)) / max(len(union), 1))
+        shortlisted = {candidate_labels[j] for j in shortlist}
+        hits += sum(tag in shortlisted for tag in tags)
+        total += len(tags)
+
+    return {
+        "top_k": top_k,
+        "exact_match": float(np.mean([a == b for a, b in zip(full, prefiltered)])),
+        "jaccard": float(np.mean(jaccards)),
+        "shortlist_recall": hits / max(total, 1),
+        "seconds_full": seconds_full,
+        "seconds_prefiltered": seconds_prefiltered,
+    }
@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import Formatter, getLogger
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Callable, Iterator
+
+logger = getLogger(__name__)
+# spans are written by a logger of their own, so that the file is rotated
+span_logger = getLogger(f"{__name__}.spans")
+span_logger.propagate = False
+
+QUANTILES = (0.5, 0.95)
+
+_job: ContextVar[str | None] = ContextVar("job", default=None)
+_span: ContextVar["Span | None"] = ContextVar("span", default=None)
+
+
+@dataclass
+class Span:
+    stage: str
+    job: str | None = None
+    duration: float = 0.0
+    bytes: int = 0
+    items: int = 0
+    retries: int = 0
+    error: str | None = None
+
+
+class Metrics:
+    """Timings of the stages of the jobs, e.g. how long engrafo took for
+    a paper, how many bytes were downloaded, how many images were uploaded
+    and how many times the Notion API was retried.
+
+    Each span is written as a JSON line to a file, if it is configured,
+    and aggregated in memory for `summary` and `prometheus`. Latency
+    quantiles are computed over the last `window` spans of each stage.
+    """
+
+    def __init__(self, window: int = 1000) -> None:
+        self.window = window
+        self._lock = threading.Lock()
+        self._durations: dict[str, deque] = defaultdict(
+            lambda: deque(maxlen=self.window)
+        )
+        self._totals: dict[str, dict[str, float]] = defaultdict(
+            lambda: dict.fromkeys(
+                ("count", "seconds", "bytes", "items", "retries", "errors"), 0
+            )
+        )
+        self._gauges: dict[str, tuple[str, str, Callable[[], dict]]] = {}
+
+    def configure(
+        self,
+        path: str | Path | None = None,
+        max_mb: float = 64,
+        window: int | None = None,
+    ) -> None:
+        """Set where spans are written. Call it once at startup.
+
+        Parameters
+        ----------
+        path : str | Path | None, optional
+            JSON lines file of the spans, by default None (not written)
+        max_mb : float, optional
+            size (MiB) at which the file is rotated, by default 64
+        window : int | None, optional
+            number of recent spans of each stage to compute the quantiles from,
+            by default None (unchanged)
+        """
+        for handler in list(span_logger.handlers):
+            span_logger.removeHandler(handler)
+            handler.close()
+
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(
+                path, maxBytes=int(max_mb * 1024 * 1024), backupCount=1
+            )
+            handler.setFormatter(Formatter("%(message)s"))
+            span_logger.addHandler(handler)
+            span_logger.setLevel("INFO")
+
+        if window is not None:
+            with self._lock:
+                self.window = window
+                self._durations.clear()
+
+    @contextmanager
+    def job(self, job: str) -> Iterator[None]:
+        """Attribute the spans in this block, in this thread, to the job."""
+        token = _job.set(job)
+        try:
+            yield
+        finally:
+            _job.reset(token)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[Span]:
+        """Time the block as a span of the stage. Its bytes and items can be
+        set in the block, and its retries are counted by `retry`.
+
+        Parameters
+        ----------
+        stage : str
+            name of the stage, e.g. "engrafo"
+
+        Yields
+        ------
+        Span
+            span, which is recorded when the block exits
+        """
+        span = Span(stage=stage, job=_job.get())
+        token = _span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            _span.reset(token)
+            self.record(span)
+
+    def retry(self, count: int = 1) -> None:
+        """Count a retry in the innermost span of this thread, if any."""
+        span = _span.get()
+        if span is not None:
+            span.retries += count
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self._durations[span.stage].append(span.duration)
+            totals = self._totals[span.stage]
+            totals["count"] += 1
+            totals["seconds"] += span.duration
+            totals["bytes"] += span.bytes
+            totals["items"] += span.items
+            totals["retries"] += span.retries
+            totals["errors"] += span.error is not None
+
+        if span_logger.handlers:
+            span_logger.info(
+                json.dumps(
+                    {"time": round(time.time(), 3), **span.__dict__},
+                    ensure_ascii=False,
+                )
+            )
+
+    def register_gauge(
+        self, name: str, help: str, label: str, values: Callable[[], dict]
+    ) -> None:
+        """Export the values returned by the function at each scrape, e.g. the
+        number of jobs in each state, as a gauge labeled by their keys."""
+        self._gauges[name] = (help, label, values)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Totals and latency quantiles (p50, p95) of each stage."""
+        with self._lock:
+            stages = {
+                stage: {
+                    **totals,
+                    **{
+                        f"p{round(q * 100)}": _quantile(
+                            sorted(self._durations[stage]), q
+                        )
+                        for q in QUANTILES
+                    },
+                }
+                for stage, totals in self._totals.items()
+            }
+        return stages
+
+    def prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        summary = self.summary()
+        lines = [
+            "# HELP archive_stage_duration_seconds Duration of the stages of the jobs",
+            "# TYPE archive_stage_duration_seconds summary",
+        ]
+        for stage, values in sorted(summary.items()):
+            for q in QUANTILES:
+                lines.append(
+                    f'archive_stage_duration_seconds{{stage="{stage}",quantile="{q}"}} '
+                    f"{values[f'p{round(q * 100)}']}"
+                )
+            lines.append(
+                f'archive_stage_duration_seconds_sum{{stage="{stage}"}} '
+                f"{values['seconds']}"
+            )
+            lines.append(
+                f'archive_stage_duration_seconds_count{{stage="{stage}"}} '
+                f"{values['count']}"
+            )
+
+        for key, help in (
+            ("bytes", "Bytes transferred by the stages"),
+            ("items", "Items processed by the stages"),
+            ("retries", "Retries made by the stages"),
+            ("errors", "Spans of the stages which raised"),
+        ):
+            lines.append(f"# HELP archive_stage_{key}_total {help}")
+            lines.append(f"# TYPE archive_stage_{key}_total counter")
+            for stage, values in sorted(summary.items()):
+                lines.append(
+                    f'archive_stage_{key}_total{{stage="{stage}"}} {values[key]}'
+                )
+
+        for name, (help, label, values) in sorted(self._gauges.items()):
+            try:
+                current = values()
+            except Exception:
+                logger.exception(f"Failed to get the values of {name}")
+                continue
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in sorted(current.items()):
+                lines.append(f'{name}{{{label}="{key}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve `metrics.prometheus()` at http://host:port/metrics in a daemon
+    thread, for Prometheus to scrape.
+
+    Parameters
+    ----------
+    port : int
+        port to listen on
+    host : str, optional
+        address to listen on, by default "0.0.0.0"
+    Returns
+    -------
+    ThreadingHTTPServer
+        running server, which stops when `shutdown` is called
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            logger.debug(format % args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    ).start()
+    logger.info(f"Serving metrics at http://{host}:{port}/metrics")
+    return server
+
+
+def _quantile(values: list[float], q: float) -> float:
+    # nearest rank
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+metrics = Metrics()
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import gc
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Any
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class _RegisteredModel:
+    model: Any
+    size_bytes: int
+    last_used: float
+
+
+class ModelRegistry:
+    """Process-wide cache of transformers pipelines.
+
+    Each pipeline is loaded lazily on first use and shared afterwards.
+    When the total size of resident models exceeds the memory budget,
+    least recently used ones are unloaded, and models that have not been
+    used for `idle_timeout` seconds are unloaded in the background.
+
+    Parameters
+    ----------
+    memory_budget_mb : float | None, optional
+        upper bound of the memory used by resident models, by default None (unbounded)
+    idle_timeout : float | None, optional
+        seconds after which an unused model is unloaded, by default None (never)
+    """
+
+    def __init__(
+        self,
+        memory_budget_mb: float | None = None,
+        idle_timeout: float | None = None,
+    ) -> None:
+        self._models: OrderedDict[tuple[str, str], _RegisteredModel] = OrderedDict()
+        self._lock = threading.RLock()
+        self._sweeper: threading.Thread | None = None
+        self.memory_budget_mb = memory_budget_mb
+        self.idle_timeout = idle_timeout
+
+    def configure(
+        self,
+        memory_budget_mb: float | None = None,
+        idle_timeout: float | None = None,
+    ) -> None:
+        """Change the memory budget and the idle timeout of the registry."""
+        with self._lock:
+            self.memory_budget_mb = memory_budget_mb
+            self.idle_timeout = idle_timeout
+            self._enforce_budget()
+
+    def get_pipeline(self, task: str, model: str, **kwargs) -> Any:
+        """Get the pipeline of the task & model, loading it if it is not resident.
+
+        Parameters
+        ----------
+        task : str
+            task name passed to transformers.pipeline, e.g. "translation"
+        model : str
+            model name passed to transformers.pipeline
+        **kwargs
+            other keyword arguments passed to transformers.pipeline
+            when the pipeline is loaded
+
+        Returns
+        -------
+        transformers.Pipeline
+            the shared pipeline
+        """
+        key = (task, model)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is None:
+                from transformers import pipeline
+
+                started = time.perf_counter()
+                loaded = pipeline(task, model=model, **kwargs)
+                entry = _RegisteredModel(
+                    model=loaded,
+                    size_bytes=_estimate_size_bytes(loaded),
+                    last_used=time.monotonic(),
+                )
+                self._models[key] = entry
+                logger.info(
+                    f"Loaded {model} ({entry.size_bytes / 2**20:.0f} MiB) "
+                    f"in {time.perf_counter() - started:.1f}s"
+                )
+                self._enforce_budget(keep=key)
+                self._start_sweeper()
+
+            entry.last_used = time.monotonic()
+            self._models.move_to_end(key)
+            return entry.model
+
+    def evict(self, task: str, model: str) -> None:
+        """Unload the pipeline of the task & model if it is resident."""
+        with self._lock:
+            self._evict((task, model))
+
+    def evict_idle(self) -> None:
+        """Unload the pipelines which have not been used for `idle_timeout` seconds."""
+        with self._lock:
+            if self.idle_timeout is None:
+                return
+            now = time.monotonic()
+            for key, entry in list(self._models.items()):
+                if now - entry.last_used > self.idle_timeout:
+                    self._evict(key)
+
+    def clear(self) -> None:
+        """Unload all pipelines."""
+        with self._lock:
+            for key in list(self._models):
+                self._evict(key)
+
+    @property
+    def resident_mb(self) -> float:
+        """Total size of the resident pipelines in MiB."""
+        with self._lock:
+            return sum(entry.size_bytes for entry in self._models.values()) / 2**20
+
+    def _enforce_budget(self, keep: tuple[str, str] | None = None) -> None:
+        if self.memory_budget_mb is None:
+            return
+        # the LRU model comes first; never evict the model being requested
+        for key in list(self._models):
+            if self.resident_mb <= self.memory_budget_mb:
+                break
+            if key != keep:
+                self._evict(key)
+
+    def _evict(self, key: tuple[str, str]) -> None:
+        entry = self._models.pop(key, None)
+        if entry is None:
+            return
+        del entry
+        gc.collect()
+        try:
+            import torch
+
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+        logger.info(f"Unloaded {key[1]}")
+
+    def _start_sweeper(self) -> None:
+        if self.idle_timeout is None or self._sweeper is not None:
+            return
+
+        def sweep() -> None:
+            while True:
+                time.sleep(max((self.idle_timeout or 60) / 2, 1))
+                self.evict_idle()
+
+        self._sweeper = threading.Thread(target=sweep, daemon=True)
+        self._sweeper.start()
+
+
+def _estimate_size_bytes(pipe: Any) -> int:
+    model = getattr(pipe, "model", None)
+    if model is None or not hasattr(model, "parameters"):
+        return 0
+    size = sum(p.numel() * p.element_size() for p in model.parameters())
+    size += sum(b.numel() * b.element_size() for b in model.buffers())
+    return size
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import itertools
+import json
+import subprocess
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from logging import getLogger
+from pathlib import Path
+from typing import Any
+
+logger = getLogger(__name__)
+
+
+class SidecarError(Exception):
+    """Raised when the Node sidecar cannot serve a request."""
+
+
+class NodeSidecar:
+    """Long-running `node js/sidecar.js` process, which serves readability
+    and markdown->notion conversions over JSON-RPC on stdin/stdout.
+
+    The process is started on first use, health-checked with `ping`, and
+    restarted when it has crashed. Requests from several threads are
+    multiplexed over the same pipe and served concurrently by Node.
+
+    Parameters
+    ----------
+    script : str | Path, optional
+        path to the sidecar script, by default "js/sidecar.js"
+    timeout : float, optional
+        seconds to wait for a response, by default 120
+    restart_backoff : float, optional
+        seconds during which no restart is attempted after the sidecar
+        failed to start, by default 60
+    """
+
+    def __init__(
+        self,
+        script: str | Path = "js/sidecar.js",
+        timeout: float = 120,
+        restart_backoff: float = 60,
+    ) -> None:
+        self.script = Path(script)
+        self.timeout = timeout
+        self.restart_backoff = restart_backoff
+        self.restarts = 0
+        self._failed_at = float("-inf")
+        self._process: subprocess.Popen | None = None
+        self._pending: dict[int, Future] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def call(self, method: str, timeout: float | None = None, **params) -> Any:
+        """Call a method of the sidecar, starting or restarting it if needed.
+
+        Parameters
+        ----------
+        method : str
+            method name, such as "readable" or "markdown_to_notion"
+        timeout : float | None, optional
+            seconds to wait for the response, by default `self.timeout`
+        **params
+            parameters of the method
+        Returns
+        -------
+        Any
+            result of the method
+
+        Raises
+        ------
+        SidecarError
+            if the sidecar cannot be started, crashed, timed out or returned an error
+        """
+        process = self._ensure_started()
+
+        return self._send(process, method, timeout or self.timeout, params)
+
+    def healthy(self) -> bool:
+        """Whether the sidecar is running and answers `ping`."""
+        try:
+            return self.call("ping", timeout=10) == "pong"
+        except SidecarError:
+            return False
+
+    def stop(self) -> None:
+        with self._lock:
+            process, self._process = self._process, None
+        if process is not None and process.poll() is None:
+            process.stdin.close()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def _send(
+        self,
+        process: subprocess.Popen,
+        method: str,
+        timeout: float,
+        params: dict,
+    ) -> Any:
+        request_id = next(self._ids)
+        future: Future = Future()
+        with self._lock:
+            self._pending[request_id] = future
+
+        message = json.dumps(
+            {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+        )
+        try:
+            with self._write_lock:
+                process.stdin.write(message + "\n")
+                process.stdin.flush()
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise SidecarError(f"sidecar timed out on {method}")
+        except (BrokenPipeError, OSError) as e:
+            raise SidecarError(f"sidecar is not available: {e}")
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+
+    def _ensure_started(self) -> subprocess.Popen:
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return self._process
+
+            # do not keep spawning a sidecar which cannot start
+            if time.monotonic() - self._failed_at < self.restart_backoff:
+                raise SidecarError("sidecar failed to start recently")
+
+            if self._process is not None:
+                self.restarts += 1
+                logger.warning(
+                    f"Node sidecar exited with {self._process.returncode}; restarting"
+                )
+
+            try:
+                self._process = subprocess.Popen(
+                    ["node", str(self.script)],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    text=True,
+                    encoding="utf-8",
+                    bufsize=1,
+                )
+            except OSError as e:
+                self._process = None
+                self._failed_at = time.monotonic()
+                raise SidecarError(f"failed to start sidecar: {e}")
+
+            threading.Thread(
+                target=self._read_responses, args=(self._process,), daemon=True
+            ).start()
+            started = self._process
+
+        # the first request waits for node to load its modules
+        try:
+            if self._send(started, "ping", 30, {}) != "pong":
+                raise SidecarError("sidecar did not answer ping")
+        except SidecarError:
+            self._failed_at = time.monotonic()
+            started.kill()
+            raise
+        logger.info(f"Started Node sidecar (pid {started.pid})")
+
+        return started
+
+    def _read_responses(self, process: subprocess.Popen) -> None:
+        for line in process.stdout:
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Unexpected output from sidecar: {line.rstrip()}")
+                continue
+
+            with self._lock:
+                future = self._pending.get(response.get("id"))
+            if future is None or future.done():
+                continue
+
+            if "error" in response:
+                future.set_exception(SidecarError(response["error"]["message"]))
+            else:
+                future.set_result(response.get("result"))
+
+        # the process has exited: fail everything still waiting on it
+        process.wait()
+        with self._lock:
+            pending = list(self._pending.values())
+        for future in pending:
+            if not future.done():
+                future.set_exception(
+                    SidecarError(f"sidecar exited with {process.returncode}")
+                )
+
+
+node_sidecar = NodeSidecar()
+
+
+def extract_readable(url: str, cache_path: Path, html: str | None = None) -> dict:
+    """Extract the article of the URL (or of the given HTML) with readability.
+    The sidecar is used when available, otherwise `js/readable.js` is spawned.
+
+    Parameters
+    ----------
+    url : str
+        URL of the web page
+    cache_path : Path
+        Path to the directory used by the fallback script
+    html : str | None, optional
+        raw HTML of the web page, if already fetched, by default None
+    Returns
+    -------
+    dict
+        result of readability, which has "title" and "content"
+    """
+    try:
+        params = {"url": url} if html is None else {"url": url, "html": html}
+        return node_sidecar.call("readable", **params)
+    except SidecarError as e:
+        logger.warning(f"Falling back to js/readable.js: {e}")
+
+    source = url
+    if html is not None:
+        source = cache_path.absolute() / "readable.html"
+        source.write_text(html)
+
+    subprocess.run(
+        ["node", "js/readable.js", source, cache_path.absolute() / "readable.json"]
+    )
+
+    with open(cache_path.absolute() / "readable.json", "r") as f:
+        return json.load(f)
+
+
+def markdown_to_notion(markdown: str, cache_path: Path) -> list:
+    """Convert markdown to notion blocks with martian.
+    The sidecar is used when available, otherwise `js/markdown_to_notion.js` is spawned.
+
+    Parameters
+    ----------
+    markdown : str
+        markdown to convert
+    cache_path : Path
+        Path to the directory used by the fallback script
+    Returns
+    -------
+    list
+        notion blocks
+    """
+    try:
+        return node_sidecar.call("markdown_to_notion", markdown=markdown)
+    except SidecarError as e:
+        logger.warning(f"Falling back to js/markdown_to_notion.js: {e}")
+
+    with open(cache_path.absolute() / "content.md", "w") as f:
+        f.write(markdown)
+
+    subprocess.run(
+        [
+            "node",
+            "js/markdown_to_notion.js",
+            cache_path.absolute() / "content.md",
+            cache_path.absolute() / "content.json",
+        ]
+    )
+
+    with open(cache_path.absolute() / "content.json", "r") as f:
+        return json.load(f)
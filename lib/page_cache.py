@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from logging import getLogger
+from pathlib import Path
+
+import requests
+
+from .canonicalize_url import canonicalize_url
+from .http_session import get_session
+from .metrics import metrics
+from .node_sidecar import extract_readable
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class CachedPage:
+    url: str
+    html: str
+    readable: dict | None
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+
+
+class PageCache:
+    """On-disk cache of article pages keyed by canonical URL, which keeps
+    the raw HTML, the result of readability and the validators of the response.
+
+    Parameters
+    ----------
+    path : str | Path
+        path to the SQLite database file
+    max_mb : float, optional
+        upper bound of the total size of the cached pages; least recently
+        used pages are evicted beyond it, by default 512
+    ttl : float, optional
+        seconds during which a cached page is used without asking the server.
+        Older pages are revalidated with a conditional GET, by default 86400
+    max_age : float, optional
+        seconds after which a page is evicted even if the cache is not full,
+        by default 30 days
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_mb: float = 512,
+        ttl: float = 86400,
+        max_age: float = 30 * 86400,
+    ) -> None:
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.max_mb = max_mb
+        self.ttl = ttl
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, html TEXT NOT NULL, readable TEXT, "
+                "etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)"
+            )
+
+    def get(self, url: str) -> CachedPage | None:
+        """Get the cached page of the URL, or None if it is not cached."""
+        key = canonicalize_url(url)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT html, readable, etag, last_modified, fetched_at "
+                "FROM pages WHERE url = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), key)
+            )
+
+        html, readable, etag, last_modified, fetched_at = row
+        return CachedPage(
+            url=key,
+            html=html,
+            readable=json.loads(readable) if readable is not None else None,
+            etag=etag,
+            last_modified=last_modified,
+            fetched_at=fetched_at,
+        )
+
+    def put(self, page: CachedPage) -> None:
+        """Save the page, evicting old pages if the cache is full."""
+        readable = json.dumps(page.readable) if page.readable is not None else None
+        size = len(page.html.encode()) + len((readable or "").encode())
+        key = canonicalize_url(page.url)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    page.html,
+                    readable,
+                    page.etag,
+                    page.last_modified,
+                    page.fetched_at,
+                    time.time(),
+                    size,
+                ),
+            )
+            self._evict()
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        return time.time() - page.fetched_at < self.ttl
+
+    def _evict(self) -> None:
+        self._conn.execute(
+            "DELETE FROM pages WHERE fetched_at < ?", (time.time() - self.max_age,)
+        )
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM pages"
+        ).fetchone()[0]
+        max_bytes = self.max_mb * 2**20
+        if total <= max_bytes:
+            return
+
+        for url, size in self._conn.execute(
+            "SELECT url, size FROM pages ORDER BY accessed_at"
+        ).fetchall():
+            self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            total -= size
+            if total <= max_bytes:
+                break
+
+
+@lru_cache(maxsize=None)
+def get_page_cache(
+    path: str | Path,
+    max_mb: float = 512,
+    ttl: float = 86400,
+) -> PageCache:
+    """Get the page cache of the path, which is opened once per process."""
+    return PageCache(path, max_mb=max_mb, ttl=ttl)
+
+
+def fetch_readable(
+    url: str,
+    workspace: Path,
+    page_cache: PageCache | None = None,
+) -> dict:
+    """Fetch the web page and extract the article with readability,
+    reusing the cached result when possible:
+
+    - within the TTL, the cached result is returned without any request
+    - after the TTL, the page is revalidated with a conditional GET, and
+      the cached result is returned if the server answers 304
+    - otherwise the page is downloaded and extracted again
+
+    Parameters
+    ----------
+    url : str
+        URL of the web page
+    workspace : Path
+        Path to the directory used when readability falls back to a script
+    page_cache : PageCache | None, optional
+        cache of pages, by default None (always fetch)
+    Returns
+    -------
+    dict
+        result of readability, which has "title" and "content"
+    """
+    return extract_page(fetch_page(url, page_cache), workspace, page_cache)
+
+
+def fetch_page(url: str, page_cache: PageCache | None = None) -> CachedPage:
+    """Network half of `fetch_readable`: get the page from the cache or the
+    server. `readable` of the page is None if it has to be extracted again."""
+    cached = page_cache.get(url) if page_cache is not None else None
+
+    if (
+        cached is not None
+        and cached.readable is not None
+        and page_cache.is_fresh(cached)
+    ):
+        logger.debug(f"Using cached page: {url}")
+        return cached
+
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+    with metrics.span("fetch") as span:
+        res = get_session().get(url, headers=headers)
+
+        if res.status_code == 304 and cached is not None:
+            logger.debug(f"Page not modified: {url}")
+            html, readable = cached.html, cached.readable
+        else:
+            res.raise_for_status()
+            html, readable = _decode(res), None
+            span.bytes = len(res.content)
+
+    page = CachedPage(
+        url=url,
+        html=html,
+        readable=readable,
+        etag=res.headers.get("ETag") or (cached.etag if cached else None),
+        last_modified=res.headers.get("Last-Modified")
+        or (cached.last_modified if cached else None),
+        fetched_at=time.time(),
+    )
+    # the HTML is kept even if the extraction fails, so that a retry is offline
+    if page_cache is not None:
+        page_cache.put(page)
+
+    return page
+
+
+def extract_page(
+    page: CachedPage,
+    workspace: Path,
+    page_cache: PageCache | None = None,
+) -> dict:
+    """CPU half of `fetch_readable`: extract the article from the fetched page
+    with readability, unless it has been extracted already."""
+    if page.readable is None:
+        with metrics.span("readability") as span:
+            span.bytes = len(page.html.encode())
+            page.readable = extract_readable(page.url, workspace, html=page.html)
+        if page_cache is not None:
+            page_cache.put(page)
+
+    return page.readable
+
+
+def _decode(res: requests.Response) -> str:
+    """Decode the body, preferring the charset of the header, then of <meta>."""
+    if "charset" in res.headers.get("Content-Type", "").lower():
+        return res.text
+
+    match = re.search(rb"""<meta[^>]+charset=["']?([\w-]+)""", res.content[:4096], re.I)
+    if match is not None:
+        try:
+            return res.content.decode(match.group(1).decode(), errors="replace")
+        except LookupError:
+            pass
+
+    res.encoding = res.apparent_encoding
+    return res.text
@@ -0,0 +1,417 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
+from functools import partial
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from .arxiv_metadata import ArxivMetadataService, get_arxiv_metadata_service
+from .get_web_content import extract_web_content, fetch_web_content
+from .job_queue import Job
+from .kv_store import KeyValueStore, get_store
+from .label_text import label_texts
+from .metrics import metrics
+from .page_cache import PageCache, get_page_cache
+from .post_to_notion import post_to_notion
+from .workspace import job_workspace
+
+logger = getLogger(__name__)
+
+STAGES = ("fetch", "extract", "classify", "upload")
+
+# put into the queue of a stage after its last item, once per worker
+_END = object()
+
+
+@dataclass
+class Caches:
+    """Persistent caches shared by all URLs archived in the process."""
+
+    page_cache: PageCache | None = None
+    arxiv_metadata: ArxivMetadataService | None = None
+    translation_cache: KeyValueStore | None = None
+    gyazo_index: KeyValueStore | None = None
+
+
+def open_caches(
+    data_path: Path | None,
+    page_cache_max_mb: float = 512,
+    page_cache_ttl: float = 86400,
+) -> Caches:
+    """Open the caches kept under `data_path`, or none of them if it is None."""
+    if data_path is None:
+        return Caches()
+
+    return Caches(
+        page_cache=get_page_cache(
+            data_path / "pages.sqlite3", max_mb=page_cache_max_mb, ttl=page_cache_ttl
+        ),
+        arxiv_metadata=get_arxiv_metadata_service(data_path / "arxiv_metadata.sqlite3"),
+        translation_cache=get_store(data_path / "translations.sqlite3"),
+        gyazo_index=get_store(data_path / "gyazo_index.sqlite3"),
+    )
+
+
+@dataclass
+class _Item:
+    url: str
+    # removes the workspace of the URL when it is closed
+    stack: ExitStack
+    value: Any = None
+    # job of the queue which the URL was claimed from, if any
+    job: Job | None = None
+    started: float | None = None
+
+
+class Pipeline:
+    """Archive URLs in four overlapped stages connected by bounded queues:
+
+    - fetch: download the web page, or the arXiv metadata and source
+    - extract: render, extract and convert the content (readability,
+      engrafo, figures, translation, Notion blocks)
+    - classify: label the contents, batching the ones waiting together
+    - upload: upload the images to Gyazo and the page to Notion
+
+    so that URL N+1 is fetched while URL N is classified and URL N-1 is
+    uploaded. Each stage runs its work in a thread pool of its own, with
+    as many threads as its concurrency; the heavy CPU work is released from
+    the GIL by the models, or already runs in subprocesses (readability,
+    engrafo, figure rasterization). A stage whose output queue is full
+    stops taking items, which in turn stops the URLs from being read,
+    so that a slow stage never makes the others pile up work. The queue
+    depths and the busy workers of the stages are logged periodically, and
+    exported as gauges of `metrics`.
+
+    Parameters
+    ----------
+    cache_path : Path
+        Path to the cache directory, under which the workspaces are created
+    arxiv_categories : dict[str, str]
+        Dictionary of arXiv categories.
+    candidate_labels : list[str]
+        candidate labels, which is given at 'config/config.py'
+    notion_access_token : str
+        notion access token.
+    gyazo_access_token : str
+        gyazo access token.
+    database_id : str
+        database id of the notion.
+    threshold : float, optional
+        threshold passed to label_texts, by default 0.9
+    prefilter_top_k : int | None, optional
+        prefilter_top_k passed to label_texts, by default None
+    data_path : Path | None, optional
+        Path to the directory where the persistent caches are kept,
+        by default None
+    notion_converter : str, optional
+        notion_converter passed to extract_web_content, by default "native"
+    page_cache_max_mb : float, optional
+        size limit of the cache of fetched pages, by default 512
+    page_cache_ttl : float, optional
+        seconds during which a fetched page is reused without revalidation,
+        by default 86400
+    concurrency : dict[str, int] | None, optional
+        number of URLs processed at the same time by each stage, by default
+        {"fetch": 4, "extract": 2, "classify": 1, "upload": 4}
+    queue_size : int, optional
+        number of URLs waiting in front of each stage, by default 4
+    classify_batch_size : int, optional
+        upper bound of the contents labeled at once, by default 8
+    log_interval : float, optional
+        seconds between logs of the queue depths, by default 60
+    """
+
+    def __init__(
+        self,
+        cache_path: Path,
+        arxiv_categories: dict[str, str],
+        candidate_labels: list[str],
+        notion_access_token: str,
+        gyazo_access_token: str,
+        database_id: str,
+        threshold: float = 0.9,
+        prefilter_top_k: int | None = None,
+        data_path: Path | None = None,
+        notion_converter: str = "native",
+        page_cache_max_mb: float = 512,
+        page_cache_ttl: float = 86400,
+        concurrency: dict[str, int] | None = None,
+        queue_size: int = 4,
+        classify_batch_size: int = 8,
+        log_interval: float = 60,
+    ) -> None:
+        self.cache_path = cache_path
+        self.arxiv_categories = arxiv_categories
+        self.candidate_labels = candidate_labels
+        self.notion_access_token = notion_access_token
+        self.gyazo_access_token = gyazo_access_token
+        self.database_id = database_id
+        self.threshold = threshold
+        self.prefilter_top_k = prefilter_top_k
+        self.notion_converter = notion_converter
+        self.caches = open_caches(data_path, page_cache_max_mb, page_cache_ttl)
+
+        self.concurrency = {"fetch": 4, "extract": 2, "classify": 1, "upload": 4}
+        self.concurrency.update(concurrency or {})
+        unknown = set(self.concurrency) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown stages: {sorted(unknown)}")
+
+        self.queue_size = queue_size
+        self.classify_batch_size = classify_batch_size
+        self.log_interval = log_interval
+        self.queues: dict[str, asyncio.Queue] = {}
+        self.busy = {stage: 0 for stage in STAGES}
+        self.results: dict[str, Exception | None] = {}
+        self._on_result: Callable[[Any, Exception | None], object] | None = None
+
+    def depths(self) -> dict[str, int]:
+        """Number of URLs waiting in front of each stage."""
+        return {stage: queue.qsize() for stage, queue in self.queues.items()}
+
+    async def run(
+        self,
+        urls: Iterable[str | Job],
+        on_result: Callable[[Any, Exception | None], object] | None = None,
+    ) -> dict[str, Exception | None]:
+        """Archive the URLs. A failure of one URL is logged and does not stop
+        the others.
+
+        Parameters
+        ----------
+        urls : Iterable[str | Job]
+            URLs to archive, or jobs of a `JobQueue`. Blank lines and
+            surrounding whitespace are ignored, and the URLs are read as the
+            stages make room for them, so a file object or sys.stdin can be
+            given as is.
+        on_result : Callable[[Any, Exception | None], object] | None, optional
+            called with each URL (or job) and the exception raised for it,
+            or None if it succeeded, as soon as it is finished, by default
+            None. A job whose URL is blank fails at once.
+
+        Returns
+        -------
+        dict[str, Exception | None]
+            exception raised for each URL, or None if it succeeded. If a URL
+            is given several times, the copy which finished last.
+        """
+        self.queues = {stage: asyncio.Queue(self.queue_size) for stage in STAGES}
+        self.results = {}
+        self._on_result = on_result
+        metrics.register_gauge(
+            "archive_pipeline_queue_depth",
+            "URLs waiting in front of each stage of the pipeline",
+            "stage",
+            self.depths,
+        )
+        metrics.register_gauge(
+            "archive_pipeline_busy",
+            "URLs being processed by each stage of the pipeline",
+            "stage",
+            lambda: dict(self.busy),
+        )
+
+        executors = {
+            stage: ThreadPoolExecutor(
+                max_workers=self.concurrency[stage],
+                thread_name_prefix=f"pipeline-{stage}",
+            )
+            for stage in STAGES
+        }
+        steps = {
+            "fetch": self._fetch,
+            "extract": self._extract,
+            "upload": self._upload,
+        }
+
+        stages = [self._read(urls)]
+        for i, stage in enumerate(STAGES):
+            next_stage = STAGES[i + 1] if i + 1 < len(STAGES) else None
+            if stage == "classify":
+                worker = partial(self._classify_worker, executors[stage], next_stage)
+            else:
+                worker = partial(
+                    self._worker, stage, steps[stage], executors[stage], next_stage
+                )
+            stages.append(self._stage(stage, worker, next_stage))
+
+        monitor = asyncio.ensure_future(self._monitor())
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            monitor.cancel()
+            for executor in executors.values():
+                executor.shutdown(wait=False)
+
+        return self.results
+
+    async def _read(self, urls: Iterable[str | Job]) -> None:
+        loop = asyncio.get_running_loop()
+        iterator = iter(urls)
+        while True:
+            # reading stdin blocks, so it is done out of the event loop
+            source = await loop.run_in_executor(None, next, iterator, _END)
+            if source is _END:
+                break
+            job = source if isinstance(source, Job) else None
+            item = _Item(
+                url=(source.url if job else source).strip(), stack=ExitStack(), job=job
+            )
+            if item.url:
+                await self.queues["fetch"].put(item)
+            elif job is not None:
+                # unlike a blank line, a job has to be finished
+                self._finish(item, ValueError(f"Blank URL of job {job.id}"))
+
+        for _ in range(self.concurrency["fetch"]):
+            await self.queues["fetch"].put(_END)
+
+    async def _stage(
+        self, stage: str, worker: Callable, next_stage: str | None
+    ) -> None:
+        await asyncio.gather(*(worker() for _ in range(self.concurrency[stage])))
+        if next_stage is not None:
+            for _ in range(self.concurrency[next_stage]):
+                await self.queues[next_stage].put(_END)
+
+    async def _worker(
+        self,
+        stage: str,
+        step: Callable[[Any], Any],
+        executor: ThreadPoolExecutor,
+        next_stage: str | None,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queues[stage].get()
+            if item is _END:
+                return
+
+            self.busy[stage] += 1
+            try:
+                item = await loop.run_in_executor(executor, self._run, step, item)
+            except Exception as e:
+                self._finish(item, e)
+                continue
+            finally:
+                self.busy[stage] -= 1
+
+            if next_stage is not None:
+                await self.queues[next_stage].put(item)
+            else:
+                self._finish(item, None)
+
+    async def _classify_worker(
+        self, executor: ThreadPoolExecutor, next_stage: str
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self.queues["classify"]
+        done = False
+        while not done:
+            items = [await queue.get()]
+            # contents which are already waiting are labeled in the same batch
+            while (
+                len(items) < self.classify_batch_size
+                and items[-1] is not _END
+                and not queue.empty()
+            ):
+                items.append(queue.get_nowait())
+            if items[-1] is _END:
+                items.pop()
+                done = True
+
+            untagged = [item for item in items if item.value.tags is None]
+            if untagged:
+                self.busy["classify"] += len(untagged)
+                try:
+                    tags = await loop.run_in_executor(
+                        executor, self._classify, untagged
+                    )
+                except Exception as e:
+                    for item in untagged:
+                        self._finish(item, e)
+                    items = [item for item in items if item not in untagged]
+                else:
+                    for item, item_tags in zip(untagged, tags):
+                        item.value.tags = item_tags
+                finally:
+                    self.busy["classify"] -= len(untagged)
+
+            for item in items:
+                await self.queues[next_stage].put(item)
+
+    def _run(self, step: Callable[[_Item], _Item], item: _Item) -> _Item:
+        # spans recorded by the step are attributed to the URL
+        with metrics.job(item.url):
+            return step(item)
+
+    def _classify(self, items: list[_Item]) -> list[list[str]]:
+        # the batch shares its spans, so they are attributed to all its URLs
+        with metrics.job(",".join(item.url for item in items)):
+            return label_texts(
+                [item.value.cleansed_content for item in items],
+                candidate_labels=self.candidate_labels,
+                threshold=self.threshold,
+                prefilter_top_k=self.prefilter_top_k,
+            )
+
+    def _fetch(self, item: _Item) -> _Item:
+        logger.info(f"Starting to process and upload to Notion: {item.url}")
+        item.started = time.monotonic()
+
+        workspace = item.stack.enter_context(job_workspace(self.cache_path))
+        item.value = fetch_web_content(
+            url=item.url,
+            workspace=workspace,
+            page_cache=self.caches.page_cache,
+            arxiv_metadata=self.caches.arxiv_metadata,
+        )
+        return item
+
+    def _extract(self, item: _Item) -> _Item:
+        item.value = extract_web_content(
+            fetched=item.value,
+            arxiv_categories=self.arxiv_categories,
+            notion_converter=self.notion_converter,
+            page_cache=self.caches.page_cache,
+            translation_cache=self.caches.translation_cache,
+        )
+        return item
+
+    def _upload(self, item: _Item) -> _Item:
+        post_to_notion(
+            notion_access_token=self.notion_access_token,
+            gyazo_access_token=self.gyazo_access_token,
+            database_id=self.database_id,
+            processed_content=item.value,
+            gyazo_index=self.caches.gyazo_index,
+        )
+        return item
+
+    def _finish(self, item: _Item, error: Exception | None) -> None:
+        item.stack.close()
+        elapsed = time.monotonic() - (item.started or time.monotonic())
+        if error is None:
+            logger.info(
+                f"Finished processing and uploading to Notion in {elapsed:.1f}s: "
+                f"{item.url}"
+            )
+        else:
+            logger.error(
+                f"Failed to process and upload to Notion: {item.url}",
+                exc_info=error,
+            )
+
+        self.results[item.url] = error
+        if self._on_result is not None:
+            self._on_result(item.job or item.url, error)
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(self.log_interval)
+            logger.info(f"Pipeline queue depths: {self.depths()}, busy: {self.busy}")
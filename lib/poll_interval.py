@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+
+class AdaptiveInterval:
+    """Interval between polls, which is reset to the minimum when a poll finds
+    something, and is multiplied by `factor` after each idle poll up to the
+    maximum, so that bursts are followed closely and idle hours cost few calls.
+
+    Parameters
+    ----------
+    min_interval : float
+        seconds between polls while there is activity
+    max_interval : float
+        seconds between polls while there is none
+    factor : float, optional
+        growth of the interval after an idle poll, by default 2.0
+    """
+
+    def __init__(
+        self, min_interval: float, max_interval: float, factor: float = 2.0
+    ) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.current = min_interval
+
+    def next(self, active: bool) -> float:
+        """Get the seconds to wait before the next poll.
+
+        Parameters
+        ----------
+        active : bool
+            whether the last poll found something
+
+        Returns
+        -------
+        float
+            seconds to wait
+        """
+        if active:
+            self.current = self.min_interval
+        else:
+            self.current = min(self.current * self.factor, self.max_interval)
+        return self.current
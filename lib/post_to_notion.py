@@ -1,18 +1,41 @@
+from __future__ import annotations
+
+import hashlib
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from logging import getLogger
 from pathlib import Path
+from typing import Any, Callable
 
+import httpx
 import requests
-from lib import ProcessedContent
-from notion_client import Client
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
 from tqdm import tqdm
 
+from .get_web_content import ProcessedContent
+from .http_session import get_notion_client, get_session
+from .kv_store import KeyValueStore
+from .metrics import metrics
+from .rate_limiter import RateLimiter
+
+logger = getLogger(__name__)
+
+# limits of the Notion API (https://developers.notion.com/reference/request-limits)
+NOTION_MAX_CHILDREN = 100
+NOTION_MAX_RICH_TEXT = 100
+notion_rate_limiter = RateLimiter(rate=3)
+gyazo_rate_limiter = RateLimiter(rate=1, burst=2)
+
 
 def post_to_notion(
     notion_access_token: str,
     gyazo_access_token: str,
     database_id: str,
     processed_content: ProcessedContent,
+    gyazo_index: KeyValueStore | None = None,
 ) -> None:
     """Post content to Notion.
 
@@ -26,66 +49,135 @@ def post_to_notion(
         database id of the notion. this is given by environment variable.
     processed_content : ProcessedContent
         processed content of web page.
+    gyazo_index : KeyValueStore | None, optional
+        persistent index from the SHA-256 of an image to its gyazo url,
+        to avoid uploading the same image twice, by default None
     """
-    notion = Client(auth=notion_access_token)
+    notion = get_notion_client(notion_access_token)
 
     processed_content = organize_notion_blocks(
         processed_content=processed_content,
         access_token=gyazo_access_token,
+        gyazo_index=gyazo_index,
     )
 
-    time.sleep(10)
-
-    db = notion.pages.create(
-        **{
-            "parent": {
+    with metrics.span("page_create"):
+        db = call_notion(
+            notion.pages.create,
+            parent={
                 "type": "database_id",
                 "database_id": database_id,
             },
-            "properties": {
+            properties={
                 "Name": {"title": [{"text": {"content": processed_content.title}}]},
                 "Tags": {
                     "multi_select": [{"name": tag} for tag in processed_content.tags]
                 },
                 "URL": {"url": processed_content.url},
             },
-        }
-    )
+        )
 
-    for block in tqdm(
-        processed_content.notion_content,
-        total=len(processed_content.notion_content),
-        desc="Uploading blocks to notion...",
-    ):
-        if "rich_text" in block[block["type"]]:
-            if len(block[block["type"]]["rich_text"]) >= 100:
-                truncated_1 = block[block["type"]]["rich_text"][:100]
-                truncated_2 = block[block["type"]]["rich_text"][100:]
-                notion.blocks.children.append(
-                    block_id=db["id"],
-                    children=[
-                        {
-                            "type": block["type"],
-                            block["type"]: {"rich_text": truncated_1},
-                        }
-                    ],
-                )
-                notion.blocks.children.append(
-                    block_id=db["id"],
-                    children=[
-                        {
-                            "type": block["type"],
-                            block["type"]: {"rich_text": truncated_2},
-                        }
-                    ],
-                )
-                continue
-        notion.blocks.children.append(block_id=db["id"], children=[block])
+    blocks = split_oversized_blocks(processed_content.notion_content)
+    chunks = [
+        blocks[i : i + NOTION_MAX_CHILDREN]
+        for i in range(0, len(blocks), NOTION_MAX_CHILDREN)
+    ]
+
+    with metrics.span("block_append") as span:
+        span.items = len(blocks)
+        for chunk in tqdm(chunks, desc="Uploading blocks to notion..."):
+            call_notion(
+                notion.blocks.children.append, block_id=db["id"], children=chunk
+            )
+
+
+def split_oversized_blocks(blocks: list[dict]) -> list[dict]:
+    """Split blocks whose rich_text has more items than Notion accepts
+    into consecutive blocks of the same type.
+
+    Parameters
+    ----------
+    blocks : list[dict]
+        notion blocks
+    Returns
+    -------
+    list[dict]
+        notion blocks, each of which has at most NOTION_MAX_RICH_TEXT rich_text items
+    """
+    splitted = []
+    for block in blocks:
+        body = block[block["type"]]
+        rich_text = body.get("rich_text") if isinstance(body, dict) else None
+
+        if rich_text is None or len(rich_text) <= NOTION_MAX_RICH_TEXT:
+            splitted.append(block)
+            continue
+
+        pieces = [
+            rich_text[i : i + NOTION_MAX_RICH_TEXT]
+            for i in range(0, len(rich_text), NOTION_MAX_RICH_TEXT)
+        ]
+        for i, piece in enumerate(pieces):
+            piece_body = {k: v for k, v in body.items() if k != "children"}
+            piece_body["rich_text"] = piece
+            # nested blocks belong to the end of the original block
+            if i == len(pieces) - 1 and "children" in body:
+                piece_body["children"] = body["children"]
+            splitted.append(
+                {
+                    **{k: v for k, v in block.items() if k != block["type"]},
+                    block["type"]: piece_body,
+                }
+            )
+
+    return splitted
+
+
+def call_notion(
+    method: Callable[..., Any],
+    max_retries: int = 5,
+    **kwargs,
+) -> Any:
+    """Call a Notion API endpoint under the shared rate limit, retrying
+    with exponential backoff on 429 and 5xx responses.
+
+    Parameters
+    ----------
+    method : Callable[..., Any]
+        endpoint of notion_client, e.g. notion.pages.create
+    max_retries : int, optional
+        maximum number of retries, by default 5
+    **kwargs
+        arguments passed to the endpoint
+    Returns
+    -------
+    Any
+        response of the endpoint
+    """
+    for attempt in range(max_retries + 1):
+        notion_rate_limiter.acquire()
+        try:
+            return method(**kwargs)
+        except HTTPResponseError as e:
+            if attempt == max_retries or not (e.status == 429 or e.status >= 500):
+                raise
+            wait = _retry_after(e.headers.get("retry-after"), default=2**attempt)
+        except (RequestTimeoutError, httpx.TransportError):
+            if attempt == max_retries:
+                raise
+            wait = 2**attempt
+
+        logger.warning(f"Notion API request failed; retrying in {wait:.1f}s")
+        metrics.retry()
+        # hold back the other callers as well, since the limit is per integration
+        notion_rate_limiter.pause(wait)
 
 
 def organize_notion_blocks(
     processed_content: ProcessedContent,
     access_token: str,
+    gyazo_index: KeyValueStore | None = None,
+    max_workers: int = 4,
 ) -> ProcessedContent:
     """Remove invalid URLs & Upload images to gyazo.
 
@@ -95,6 +187,11 @@ def organize_notion_blocks(
         processed content of web page.
     access_token : str
         gyazo api key
+    gyazo_index : KeyValueStore | None, optional
+        persistent index from the SHA-256 of an image to its gyazo url.
+        images found in it are not uploaded again, by default None
+    max_workers : int, optional
+        number of images downloaded or uploaded at once, by default 4
     Returns
     -------
     ProcessedContent
@@ -102,48 +199,21 @@ def organize_notion_blocks(
             - image paths are replaced with gyazo urls
             - invalid urls are removed
     """
-
-    def process_for_image(block: dict) -> dict:
-        image_path_or_url = block["image"]["external"]["url"]
-
-        if "gyazo" in image_path_or_url:
-            return block
-
-        if image_path_or_url.startswith("http"):
-            image = requests.get(image_path_or_url).content
-        else:
-            image = Path(f"content/{image_path_or_url}").read_bytes()
-
-        res = upload_image_to_gyazo(image, access_token)
-        time.sleep(10)
-
-        if res.status_code == 200:
-            block["image"]["external"]["url"] = json.loads(res.text)["url"]
-        elif res.status_code == 401:
-            raise Exception("gyazo access token is invalid.")
-        else:
-            raise Exception("gyazo: unknown error occurred.")
-
-        return block
+    images = []
 
     for i, block in enumerate(processed_content.notion_content):
         if block["type"] == "image":
-            block = process_for_image(block)
-
-        # remove invalid link if it is not http(s); such as mailto: or #bib:
-        if block["type"] == "text":
-            if "link" in inner_block["text"]:
-                if block["text"]["link"]["url"][:4] != "http":
-                    del block["text"]["link"]
+            images.append(block["image"]["external"])
 
-        if block["type"] != "text" and block["type"] != "image":
+        if block["type"] != "image":
             block_type = block["type"]
             if "rich_text" in block[block_type]:
                 for inner_block in block[block_type]["rich_text"]:
                     if inner_block["type"] == "image":
-                        inner_block = process_for_image(inner_block)
+                        images.append(inner_block["image"]["external"])
+                    # remove invalid link if it is not http(s); such as mailto: or #bib:
                     if inner_block["type"] == "text":
-                        if "link" in inner_block["text"]:
+                        if inner_block["text"].get("link") is not None:
                             if inner_block["text"]["link"]["url"][:4] != "http":
                                 del inner_block["text"]["link"]
 
@@ -169,14 +239,126 @@ def organize_notion_blocks(
                 },
             }
 
+    sources = list(
+        dict.fromkeys(image["url"] for image in images if "gyazo" not in image["url"])
+    )
+    gyazo_urls = upload_images_to_gyazo(
+        sources,
+        access_token,
+        gyazo_index=gyazo_index,
+        max_workers=max_workers,
+        resource_path=processed_content.resource_path,
+    )
+
+    # write the gyazo urls back to the original positions
+    for image in images:
+        image["url"] = gyazo_urls.get(image["url"], image["url"])
+
     return processed_content
 
 
+def upload_images_to_gyazo(
+    sources: list[str],
+    access_token: str,
+    gyazo_index: KeyValueStore | None = None,
+    max_workers: int = 4,
+    resource_path: Path | None = None,
+) -> dict[str, str]:
+    """Upload images to gyazo concurrently, skipping those already uploaded.
+
+    Images are first loaded in parallel and deduplicated by their SHA-256,
+    then only the ones not found in the index are uploaded under the
+    shared rate limit of gyazo.
+
+    Parameters
+    ----------
+    sources : list[str]
+        urls or local paths of the images
+    access_token : str
+        gyazo api key
+    gyazo_index : KeyValueStore | None, optional
+        persistent index from the SHA-256 of an image to its gyazo url, by default None
+    max_workers : int, optional
+        number of images downloaded or uploaded at once, by default 4
+    resource_path : Path | None, optional
+        directory against which local paths are resolved, by default None ("content")
+    Returns
+    -------
+    dict[str, str]
+        gyazo url of each source
+    """
+    if not sources:
+        return {}
+
+    def load(source: str) -> bytes:
+        if source.startswith("http"):
+            res = get_session().get(source)
+            res.raise_for_status()
+            return res.content
+        return (resource_path or Path("content")).joinpath(source).read_bytes()
+
+    def upload(image: bytes) -> str:
+        gyazo_rate_limiter.acquire()
+        res = upload_image_to_gyazo(image, access_token)
+
+        if res.status_code == 200:
+            return json.loads(res.text)["url"]
+        elif res.status_code == 401:
+            raise Exception("gyazo access token is invalid.")
+        else:
+            raise Exception("gyazo: unknown error occurred.")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        contents = dict(zip(sources, executor.map(load, sources)))
+        digests = {
+            source: hashlib.sha256(image).hexdigest()
+            for source, image in contents.items()
+        }
+
+        known = gyazo_index.get_many(list(set(digests.values()))) if gyazo_index else {}
+        # one source per content which has never been uploaded
+        to_upload = {
+            digest: contents[source]
+            for source, digest in digests.items()
+            if digest not in known
+        }
+        logger.info(
+            f"Uploading {len(to_upload)} of {len(sources)} images to gyazo "
+            f"({len(sources) - len(to_upload)} already uploaded or duplicated)"
+        )
+
+        with metrics.span("image_upload") as span:
+            span.items = len(to_upload)
+            span.bytes = sum(len(image) for image in to_upload.values())
+            futures = {
+                digest: executor.submit(upload, image)
+                for digest, image in to_upload.items()
+            }
+            try:
+                uploaded = {
+                    digest: future.result() for digest, future in futures.items()
+                }
+            finally:
+                # the images uploaded before another one failed are indexed too,
+                # so that retrying the URL does not upload them again
+                succeeded = {
+                    digest: future.result()
+                    for digest, future in futures.items()
+                    if future.exception() is None
+                }
+                if gyazo_index is not None and succeeded:
+                    gyazo_index.set_many(succeeded)
+
+    urls_by_digest = {**known, **uploaded}
+
+    return {source: urls_by_digest[digest] for source, digest in digests.items()}
+
+
 def upload_image_to_gyazo(image: bytes, access_token: str) -> requests.Response:
 
     files = {"imagedata": image}
 
-    res = requests.request(
+    res = get_session().request(
         method="post",
         url="https://upload.gyazo.com/api/upload",
         headers={"Authorization": f"Bearer {access_token}"},
@@ -184,3 +366,20 @@ def upload_image_to_gyazo(image: bytes, access_token: str) -> requests.Response:
     )
 
     return res
+
+
+def _retry_after(value: str | None, default: float) -> float:
+    # Retry-After is either seconds or an HTTP-date
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, date.timestamp() - time.time())
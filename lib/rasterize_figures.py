@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import hashlib
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from logging import getLogger
+from pathlib import Path
+
+import pdf2image
+
+from .metrics import metrics
+
+logger = getLogger(__name__)
+
+
+class FigureRasterizer:
+    """Converts the PDF figures of arXiv sources to PNG, which engrafo can show.
+
+    Only the first page of each PDF is rendered, on a pool of processes
+    shared by all jobs, and the outputs are cached by the hash of the PDF.
+
+    Parameters
+    ----------
+    dpi : int, optional
+        resolution at which the first page is rendered, by default 150
+    max_size : int, optional
+        upper bound of the width and the height of the PNG in pixels;
+        larger pages are scaled down, by default 2000
+    max_workers : int | None, optional
+        number of processes rendering PDFs, by default None (number of CPUs)
+    cache_path : Path | None, optional
+        directory where rendered PNGs are kept, by default None (no cache)
+    """
+
+    def __init__(
+        self,
+        dpi: int = 150,
+        max_size: int = 2000,
+        max_workers: int | None = None,
+        cache_path: Path | None = None,
+    ) -> None:
+        self.dpi = dpi
+        self.max_size = max_size
+        self.max_workers = max_workers
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+
+    def configure(
+        self,
+        dpi: int = 150,
+        max_size: int = 2000,
+        max_workers: int | None = None,
+        cache_path: Path | None = None,
+    ) -> None:
+        """Change the settings of the rasterizer. The pool of processes is
+        recreated on next use."""
+        with self._lock:
+            self.dpi = dpi
+            self.max_size = max_size
+            self.max_workers = max_workers
+            self.cache_path = cache_path
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def rasterize(self, root: Path) -> None:
+        """Write `<name>.png` next to every `<name>.pdf` under the directory,
+        and make every .tex file refer to the PNGs instead of the PDFs.
+
+        Parameters
+        ----------
+        root : Path
+            directory of the extracted arXiv source
+        """
+        with metrics.span("rasterization") as span:
+            pdfs, texs = [], []
+            for dirpath, _, files in os.walk(root):
+                for file in files:
+                    if file.endswith(".pdf"):
+                        pdfs.append(Path(dirpath) / file)
+                    elif file.endswith(".tex"):
+                        texs.append(Path(dirpath) / file)
+
+            cached, futures = 0, {}
+            for pdf in pdfs:
+                png = pdf.with_suffix(".png")
+                cache = self._cache_file(pdf)
+                if cache is not None and cache.exists():
+                    shutil.copyfile(cache, png)
+                    cached += 1
+                else:
+                    futures[pdf] = (self._submit(pdf, png), cache)
+
+            # rewrite the sources while the figures are rendered
+            for tex in texs:
+                _use_png_figures(tex)
+
+            for pdf, (future, cache) in futures.items():
+                try:
+                    future.result()
+                except Exception:
+                    logger.exception(f"Failed to rasterize {pdf.name}")
+                    continue
+                if cache is not None:
+                    cache.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copyfile(pdf.with_suffix(".png"), cache)
+
+            span.items = len(futures)
+
+        if pdfs:
+            logger.info(
+                f"Rasterized {len(futures)} PDF figures ({cached} cached) "
+                f"in {span.duration:.1f}s"
+            )
+
+    def _cache_file(self, pdf: Path) -> Path | None:
+        if self.cache_path is None:
+            return None
+        digest = hashlib.sha256(pdf.read_bytes()).hexdigest()
+        return self.cache_path / f"{digest}-{self.dpi}-{self.max_size}.png"
+
+    def _submit(self, pdf: Path, png: Path) -> Future:
+        with self._lock:
+            if self._executor is None:
+                # the pool is created from a thread of a process which runs
+                # other threads (pipeline, metrics, models), and a forked child
+                # may deadlock on a lock held by one of them
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor.submit(
+                _rasterize_first_page, str(pdf), str(png), self.dpi, self.max_size
+            )
+
+
+def _rasterize_first_page(pdf: str, png: str, dpi: int, max_size: int) -> None:
+    image = pdf2image.convert_from_path(pdf, dpi=dpi, first_page=1, last_page=1)[0]
+    image.thumbnail((max_size, max_size))
+    image.save(png, "PNG")
+
+
+def _use_png_figures(tex: Path) -> None:
+    # as bytes, since sources are not always UTF-8 (e.g. latin-1)
+    data = tex.read_bytes()
+    if b".pdf" in data:
+        tex.write_bytes(data.replace(b".pdf", b".png"))
+
+
+figure_rasterizer = FigureRasterizer()
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import threading
+import time
+
+
+class RateLimiter:
+    """Thread-safe token bucket, shared by all callers of an API.
+
+    Parameters
+    ----------
+    rate : float
+        number of requests allowed per second on average
+    burst : int, optional
+        number of requests allowed at once, by default 1
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a request is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Make all callers wait for the given seconds, e.g. after a 429 response."""
+        with self._lock:
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+            self._updated = time.monotonic()
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import os
+import queue
+import re
+import shutil
+import signal
+import subprocess
+import threading
+from abc import ABC, abstractmethod
+from logging import getLogger
+from pathlib import Path
+
+from .metrics import metrics
+
+logger = getLogger(__name__)
+
+# local files referred to by the rendered HTML, e.g. figures and stylesheets
+_ASSET_REFERENCE = re.compile(
+    r"""(?:src|href)=["'](?![a-z][a-z0-9+.\-]*:|#|//)([^"'?#]+)"""
+)
+
+
+class EngrafoRunner(ABC):
+    """How engrafo is invoked. Subclass it to render somewhere else."""
+
+    @abstractmethod
+    def command(self, workspace: Path) -> list[str]:
+        """Command which renders the LaTeX source in the workspace into
+        `index.html` in the same directory."""
+
+    def cancel(self, workspace: Path) -> None:
+        """Stop a render of the workspace which is left running after its
+        command has been killed, e.g. inside a container."""
+
+
+class DockerEngrafoRunner(EngrafoRunner):
+    """Runs engrafo in a running container, in which `host_root` is mounted
+    at `container_root`.
+
+    Parameters
+    ----------
+    container : str
+        name of the engrafo container
+    host_root : Path
+        directory mounted in the container, under which workspaces are
+    container_root : str, optional
+        path of the mounted directory in the container, relative to its
+        working directory, by default "output"
+    """
+
+    def __init__(
+        self, container: str, host_root: Path, container_root: str = "output"
+    ) -> None:
+        self.container = container
+        self.host_root = host_root
+        self.container_root = container_root
+
+    def command(self, workspace: Path) -> list[str]:
+        path = self._container_path(workspace)
+        return ["docker", "exec", self.container, "engrafo", f"{path}/", f"{path}/"]
+
+    def cancel(self, workspace: Path) -> None:
+        # killing `docker exec` does not stop the process in the container
+        subprocess.run(
+            [
+                "docker",
+                "exec",
+                self.container,
+                "pkill",
+                "-f",
+                self._container_path(workspace),
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=30,
+        )
+
+    def _container_path(self, workspace: Path) -> str:
+        relative = workspace.absolute().relative_to(self.host_root.absolute())
+        return (Path(self.container_root) / relative).as_posix()
+
+
+class LocalEngrafoRunner(EngrafoRunner):
+    """Runs a local command with the workspace as both the input and the
+    output directory, e.g. an engrafo installation or a stand-in script.
+
+    Parameters
+    ----------
+    command : list[str]
+        command to which the workspace is appended twice
+    """
+
+    def __init__(self, command: list[str]) -> None:
+        self._command = list(command)
+
+    def command(self, workspace: Path) -> list[str]:
+        path = workspace.absolute().as_posix()
+        return [*self._command, f"{path}/", f"{path}/"]
+
+
+class EngrafoRenderer:
+    """Renders arXiv sources to HTML with engrafo.
+
+    Renders are spread over a pool of runners, e.g. several engrafo
+    containers, each of which renders one paper at a time. Rendered HTML and
+    the assets it refers to are cached by arXiv ID and version.
+
+    Parameters
+    ----------
+    runners : list[EngrafoRunner] | None, optional
+        runners to render with, by default None (must be configured before use)
+    timeout : float, optional
+        seconds after which a render is killed, by default 1000
+    cache_path : Path | None, optional
+        directory where rendered papers are kept, by default None (no cache)
+    """
+
+    def __init__(
+        self,
+        runners: list[EngrafoRunner] | None = None,
+        timeout: float = 1000,
+        cache_path: Path | None = None,
+    ) -> None:
+        self._runners: queue.Queue[EngrafoRunner] = queue.Queue()
+        self._lock = threading.Lock()
+        self.configure(runners, timeout=timeout, cache_path=cache_path)
+
+    def configure(
+        self,
+        runners: list[EngrafoRunner] | None = None,
+        timeout: float = 1000,
+        cache_path: Path | None = None,
+    ) -> None:
+        """Change the runners, the timeout and the cache directory.
+        Renders in progress finish with the runners they started with."""
+        with self._lock:
+            self.timeout = timeout
+            self.cache_path = cache_path
+            self._runners = queue.Queue()
+            self._size = len(runners or [])
+            for runner in runners or []:
+                self._runners.put(runner)
+
+    def restore(self, key: str | None, workspace: Path) -> bool:
+        """Copy the cached rendering of the paper into the workspace.
+
+        Parameters
+        ----------
+        key : str | None
+            arXiv ID and version, e.g. "2301.00001v2". Nothing is cached
+            when it is None.
+        workspace : Path
+            directory where `index.html` and its assets are copied
+
+        Returns
+        -------
+        bool
+            True if the paper was in the cache
+        """
+        cached = self._cache_dir(key)
+        if cached is None or not (cached / "index.html").exists():
+            return False
+
+        shutil.copytree(cached, workspace, dirs_exist_ok=True)
+        logger.info(f"Using cached engrafo rendering: {key}")
+        return True
+
+    def render(self, workspace: Path, key: str | None = None) -> Path:
+        """Render the LaTeX source in the workspace with the first free runner.
+
+        Parameters
+        ----------
+        workspace : Path
+            directory of the extracted arXiv source
+        key : str | None, optional
+            arXiv ID and version under which the result is cached,
+            by default None (not cached)
+        Returns
+        -------
+        Path
+            path to the rendered `index.html`
+
+        Raises
+        ------
+        RuntimeError
+            if no runner is configured
+        subprocess.TimeoutExpired
+            if the render takes longer than the timeout
+        """
+        with self._lock:
+            runners, size, timeout = self._runners, self._size, self.timeout
+        if size == 0:
+            raise RuntimeError("No engrafo runner is configured")
+
+        runner = runners.get()
+        with metrics.span("engrafo") as span:
+            try:
+                process = subprocess.Popen(
+                    runner.command(workspace),
+                    stdout=subprocess.DEVNULL,
+                    start_new_session=True,
+                )
+                try:
+                    returncode = process.wait(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    os.killpg(process.pid, signal.SIGKILL)
+                    process.wait()
+                    try:
+                        runner.cancel(workspace)
+                    except Exception:
+                        logger.exception(f"Failed to cancel engrafo: {workspace}")
+                    raise
+            finally:
+                runners.put(runner)
+
+            if returncode != 0:
+                span.error = f"exit status {returncode}"
+
+        logger.info(
+            f"Rendered {key or workspace.name} with engrafo in {span.duration:.1f}s"
+        )
+        if returncode != 0:
+            logger.warning(f"engrafo exited with {returncode}: {key or workspace}")
+
+        index = workspace / "index.html"
+        if returncode == 0 and index.exists():
+            self._save(key, workspace)
+        return index
+
+    def _save(self, key: str | None, workspace: Path) -> None:
+        cached = self._cache_dir(key)
+        if cached is None:
+            return
+
+        html = (workspace / "index.html").read_text(errors="replace")
+        assets = {"index.html"} | set(_ASSET_REFERENCE.findall(html))
+
+        partial = cached.with_name(f"{cached.name}.partial")
+        shutil.rmtree(partial, ignore_errors=True)
+        for asset in assets:
+            source = (workspace / asset).resolve()
+            if workspace.resolve() not in source.parents or not source.is_file():
+                continue
+            target = partial / source.relative_to(workspace.resolve())
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, target)
+
+        shutil.rmtree(cached, ignore_errors=True)
+        partial.rename(cached)
+
+    def _cache_dir(self, key: str | None) -> Path | None:
+        if key is None or self.cache_path is None:
+            return None
+        # old-style IDs have a slash, e.g. hep-th/9901001v1
+        return self.cache_path / key.replace("/", "_")
+
+
+engrafo_renderer = EngrafoRenderer()
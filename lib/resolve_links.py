@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from logging import getLogger
+
+import requests
+
+from .http_session import get_session
+from .kv_store import KeyValueStore
+
+logger = getLogger(__name__)
+
+
+def resolve_link(url: str, timeout: float = 10.0) -> str:
+    """Follow the redirects of the link, e.g. of t.co, to the final URL
+    without downloading the page: HEAD is tried first, and a streamed GET
+    which is closed right after the headers is used if HEAD is refused.
+
+    Parameters
+    ----------
+    url : str
+        link to resolve
+    timeout : float, optional
+        timeout of each connection & read, by default 10.0
+    Returns
+    -------
+    str
+        final URL
+    """
+    session = get_session()
+    try:
+        res = session.head(url, allow_redirects=True, timeout=timeout)
+        res.close()
+        if res.status_code < 400:
+            return res.url
+    except requests.RequestException as e:
+        logger.debug(f"HEAD failed, falling back to GET ({e}): {url}")
+
+    with session.get(url, allow_redirects=True, stream=True, timeout=timeout) as res:
+        return res.url
+
+
+def resolve_links(
+    urls: list[str],
+    store: KeyValueStore | None = None,
+    timeout: float = 10.0,
+    max_workers: int = 8,
+) -> dict[str, str]:
+    """Resolve many links at once.
+
+    Each link is resolved in a thread of its own and is given up after
+    `timeout` seconds in total, in which case the link itself is returned,
+    so that a slow site never delays the others.
+
+    Parameters
+    ----------
+    urls : list[str]
+        links to resolve
+    store : KeyValueStore | None, optional
+        persistent cache of the resolved links, by default None
+    timeout : float, optional
+        seconds after which a link is given up, by default 10.0
+    max_workers : int, optional
+        number of links resolved at the same time, by default 8
+    Returns
+    -------
+    dict[str, str]
+        final URL of each link
+    """
+    urls = list(dict.fromkeys(urls))
+    resolved = store.get_many(urls) if store is not None else {}
+    missing = [url for url in urls if url not in resolved]
+    if not missing:
+        return resolved
+
+    started: dict[str, float] = {}
+
+    def run(url: str) -> str:
+        started[url] = time.monotonic()
+        return resolve_link(url, timeout=timeout)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {executor.submit(run, url): url for url in missing}
+
+    pending = set(futures)
+    while pending:
+        _, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+        now = time.monotonic()
+        pending = {
+            future
+            for future in pending
+            if futures[future] not in started
+            or now - started[futures[future]] < timeout
+        }
+    # threads of the links given up end by themselves, at the socket timeouts
+    executor.shutdown(wait=False)
+
+    fetched = {}
+    for future, url in futures.items():
+        if not future.done():
+            logger.warning(f"Gave up resolving after {timeout}s: {url}")
+        elif future.exception() is not None:
+            logger.warning(f"Failed to resolve ({future.exception()}): {url}")
+        else:
+            fetched[url] = future.result()
+
+    if store is not None and fetched:
+        store.set_many(fetched)
+
+    return {url: resolved.get(url) or fetched.get(url, url) for url in urls}
@@ -1,45 +1,106 @@
 from __future__ import annotations
 
-import requests
+from logging import getLogger
+
 import tweepy
 
+from .kv_store import KeyValueStore
+from .resolve_links import resolve_links
+
+logger = getLogger(__name__)
+
 
 def retrieve_urls_from_direct_message(
     client: tweepy.Client,
     user_name: str | None = None,
     user_id: str | None = None,
     num_retrieves: int = 5,
-) -> list[str]:
+    link_cache: KeyValueStore | None = None,
+    state: KeyValueStore | None = None,
+    max_pages: int = 10,
+) -> tuple[list[str], str | None]:
     """Retrieve URLs from direct messages.
 
+    If `state` is given, the user ID is kept in it, and only the events newer
+    than the cursor saved by `save_direct_message_cursor` are retrieved,
+    paging through them `num_retrieves` at a time. The cursor is not saved
+    here, so that the caller saves it once the URLs are safely stored.
+
     Parameters
     ----------
     client : tweepy.Client
     user_name : str | None, optional
     user_id : str | None, optional
     num_retrieves : int, optional
-
+        number of events per request
+    link_cache : KeyValueStore | None, optional
+        persistent cache of the links (e.g. t.co) resolved to their final URLs
+    state : KeyValueStore | None, optional
+        persistent store of the cursor and the user ID
+    max_pages : int, optional
+        upper bound of the requests per call
 
     Returns
     -------
-    list[str] : List of URLs which are retrieved from direct messages.
+    list[str] : List of URLs which are retrieved from direct messages, oldest first.
+    str | None : New cursor (ID of the newest event), or None if there is no new event.
 
     """
     if user_id is None:
-        user_id = client.get_user(username=user_name).data["id"]
+        user_id = get_user_id(client, user_name, state)
+
+    cursor = int(state.get(_cursor_key(user_id), "0")) if state is not None else 0
+
+    events, pagination_token = [], None
+    for _ in range(max_pages):
+        direct_messages = client.get_direct_message_events(
+            participant_id=user_id,
+            max_results=num_retrieves,
+            pagination_token=pagination_token,
+        )
+        page = direct_messages.data or []
+        # events are returned newest first
+        new = [event for event in page if int(event.id) > cursor]
+        events.extend(new)
 
-    direct_messages = client.get_direct_message_events(
-        participant_id=user_id,
-        max_results=num_retrieves,
-    )
+        pagination_token = direct_messages.meta.get("next_token")
+        if cursor == 0 or len(new) < len(page) or pagination_token is None:
+            break
+    else:
+        logger.warning(f"More than {max_pages} pages of new direct messages")
 
-    urls = []
-    for message in direct_messages.data:
+    links = [
+        event.text.split()[0]
+        for event in reversed(events)
+        if (event.text or "").startswith("http")
+    ]
+    resolved = resolve_links(links, store=link_cache)
+    new_cursor = str(max(int(event.id) for event in events)) if events else None
+
+    return [resolved[link] for link in links], new_cursor
+
+
+def save_direct_message_cursor(state: KeyValueStore, user_id: str, cursor: str) -> None:
+    """Save the cursor returned by `retrieve_urls_from_direct_message`, so that
+    the next call retrieves only the events after it."""
+    state.set(_cursor_key(user_id), cursor)
+
+
+def get_user_id(
+    client: tweepy.Client,
+    user_name: str | None,
+    state: KeyValueStore | None = None,
+) -> str:
+    """Look up the user ID of the user name, which is kept in `state` if given."""
+    key = f"user_id:{user_name}"
+    if state is not None and key in state:
+        return state.get(key)
 
-        if not message.text.startswith("http"):
-            continue
+    user_id = str(client.get_user(username=user_name).data["id"])
+    if state is not None:
+        state.set(key, user_id)
+    return user_id
 
-        url = requests.get(message.text).url
-        urls.append(url)
 
-    return urls
+def _cursor_key(user_id: str) -> str:
+    return f"dm_cursor:{user_id}"
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from functools import lru_cache
+from logging import getLogger
+from pathlib import Path
+from typing import Iterable
+
+from .canonicalize_url import canonicalize_url
+
+logger = getLogger(__name__)
+
+# first line of a log whose lines are canonical URLs;
+# older logs of raw URLs are canonicalized once when they are opened
+_HEADER = "# seen-urls v1"
+
+
+class SeenUrlStore:
+    """Durable set of the URLs which have already been archived.
+
+    URLs are canonicalized, appended to a log file, and kept in a set in
+    memory, so that a membership check is a hash lookup however long the
+    history is. The log is only ever appended to, so nothing is forgotten.
+
+    Parameters
+    ----------
+    path : str | Path
+        path to the log file, e.g. content/urls.log
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._seen: set[str] = set()
+        self._load()
+
+    def __contains__(self, url: str) -> bool:
+        return canonicalize_url(url) in self._seen
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def filter_new(self, urls: Iterable[str]) -> list[str]:
+        """Get the URLs which have not been seen, without duplicates,
+        in the order they are given."""
+        new, keys = [], set()
+        for url in urls:
+            key = canonicalize_url(url)
+            if key not in self._seen and key not in keys:
+                keys.add(key)
+                new.append(url)
+        return new
+
+    def add(self, url: str) -> bool:
+        """Mark the URL as seen, and return whether it was new."""
+        return bool(self.add_many([url]))
+
+    def add_many(self, urls: Iterable[str]) -> list[str]:
+        """Mark the URLs as seen, and return the ones which were new."""
+        with self._lock:
+            new = self.filter_new(urls)
+            if not new:
+                return []
+
+            keys = [canonicalize_url(url) for url in new]
+            with open(self.path, "a") as f:
+                f.write("".join(f"{key}\n" for key in keys))
+                f.flush()
+                os.fsync(f.fileno())
+            self._seen.update(keys)
+
+        return new
+
+    def _load(self) -> None:
+        started = time.perf_counter()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists():
+            self.path.write_text(f"{_HEADER}\n")
+
+        with open(self.path) as f:
+            lines = f.read().splitlines()
+
+        if lines[:1] == [_HEADER]:
+            self._seen = set(lines[1:])
+            self._seen.discard("")
+        else:
+            # a log written by compare_and_save_urls, which has raw URLs
+            self._seen = {canonicalize_url(line) for line in lines if line.strip()}
+            partial = self.path.with_name(f"{self.path.name}.partial")
+            partial.write_text("".join(f"{key}\n" for key in [_HEADER, *self._seen]))
+            partial.replace(self.path)
+
+        logger.debug(
+            f"Loaded {len(self._seen)} seen URLs "
+            f"in {time.perf_counter() - started:.3f}s"
+        )
+
+
+@lru_cache(maxsize=None)
+def get_seen_url_store(path: str | Path) -> SeenUrlStore:
+    """Get the store of the path, which is loaded once per process."""
+    return SeenUrlStore(path)
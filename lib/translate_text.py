@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from logging import getLogger
+
+from .kv_store import KeyValueStore
+from .metrics import metrics
+from .model_registry import model_registry
+
+logger = getLogger(__name__)
+
+TRANSLATOR_MODEL = "staka/fugumt-en-ja"
+
+# abbreviations after which a period does not end a sentence
+_ABBREVIATIONS = (
+    "al", "cf", "e.g", "eq", "eqs", "etc", "fig", "figs", "i.e", "ref", "refs",
+    "resp", "sec", "vs",
+)  # fmt: skip
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+
+
+def split_sentences(text: str) -> list[str]:
+    """Split English text such as an abstract into sentences.
+
+    Parameters
+    ----------
+    text : str
+        text to split. Line breaks are treated as spaces.
+
+    Returns
+    -------
+    list[str]
+        sentences, without the surrounding whitespace
+    """
+    text = " ".join(text.split())
+
+    sentences, start = [], 0
+    for match in _SENTENCE_END.finditer(text):
+        last_word = text[start : match.start()].rsplit(" ", 1)[-1].rstrip(".")
+        if last_word.lower() in _ABBREVIATIONS:
+            continue
+        sentences.append(text[start : match.start()])
+        start = match.end()
+    sentences.append(text[start:])
+
+    return [sentence for sentence in sentences if sentence]
+
+
+def translate_text(
+    text: str,
+    store: KeyValueStore | None = None,
+    batch_size: int = 16,
+) -> str:
+    """Translate English text into Japanese sentence by sentence.
+
+    Parameters
+    ----------
+    text : str
+        text to translate
+    store : KeyValueStore | None, optional
+        persistent cache of translated sentences, by default None
+    batch_size : int, optional
+        number of sentences in a forward pass, by default 16
+    Returns
+    -------
+    str
+        translated text
+    """
+    return translate_texts([text], store=store, batch_size=batch_size)[0]
+
+
+def translate_texts(
+    texts: list[str],
+    store: KeyValueStore | None = None,
+    batch_size: int = 16,
+) -> list[str]:
+    """Translate many English texts into Japanese at once.
+    Texts are split into sentences, so that long texts are not truncated at
+    the max length of the model. The sentences of all texts which are not
+    in the store are translated together in padded batches.
+
+    Parameters
+    ----------
+    texts : list[str]
+        texts to translate, e.g. abstracts of several papers
+    store : KeyValueStore | None, optional
+        persistent cache of translated sentences, keyed by the hash of the
+        sentence, by default None
+    batch_size : int, optional
+        number of sentences in a forward pass, by default 16
+    Returns
+    -------
+    list[str]
+        translated texts, in the same order as the arguments
+    """
+    sentences = [split_sentences(text) for text in texts]
+    keys = {
+        sentence: _sentence_key(sentence) for group in sentences for sentence in group
+    }
+
+    cached = store.get_many(list(set(keys.values()))) if store is not None else {}
+    translations = {
+        sentence: cached[key] for sentence, key in keys.items() if key in cached
+    }
+
+    missing = [sentence for sentence in keys if sentence not in translations]
+    if missing:
+        translator = model_registry.get_pipeline("translation", model=TRANSLATOR_MODEL)
+
+        # sort by length, so that each batch is padded as little as possible
+        missing.sort(key=len)
+        with metrics.span("translation") as span:
+            span.items = len(missing)
+            results = translator(missing, batch_size=batch_size)
+        elapsed = span.duration
+
+        translated = {
+            sentence: result["translation_text"]
+            for sentence, result in zip(missing, results)
+        }
+        translations.update(translated)
+        if store is not None:
+            store.set_many(
+                {keys[sentence]: text for sentence, text in translated.items()}
+            )
+
+        logger.info(
+            f"Translated {len(missing)} sentences in {elapsed:.1f}s "
+            f"({len(missing) / max(elapsed, 1e-9):.1f} sentences/s), "
+            f"{len(keys) - len(missing)} cached"
+        )
+
+    return [
+        "".join(translations[sentence] for sentence in group) for group in sentences
+    ]
+
+
+def _sentence_key(sentence: str) -> str:
+    return hashlib.sha256(f"{TRANSLATOR_MODEL}\n{sentence}".encode()).hexdigest()
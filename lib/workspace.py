@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from logging import getLogger
+from pathlib import Path
+from typing import Iterator
+
+logger = getLogger(__name__)
+
+WORKSPACES_DIR = "jobs"
+
+
+@contextmanager
+def job_workspace(cache_path: Path) -> Iterator[Path]:
+    """Create a scratch directory for a job under the cache directory,
+    and remove it with everything in it when the job is finished.
+    Jobs running at the same time get different directories, so they
+    never clobber each other's files.
+
+    Parameters
+    ----------
+    cache_path : Path
+        Path to the cache directory
+
+    Yields
+    ------
+    Path
+        Path to the workspace, e.g. content/jobs/job-1a2b3c4d
+    """
+    root = cache_path / WORKSPACES_DIR
+    root.mkdir(parents=True, exist_ok=True)
+    workspace = Path(tempfile.mkdtemp(prefix="job-", dir=root))
+
+    try:
+        yield workspace
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+def remove_stale_workspaces(cache_path: Path, older_than: float = 86400) -> None:
+    """Remove workspaces left behind by jobs which were killed.
+
+    Parameters
+    ----------
+    cache_path : Path
+        Path to the cache directory
+    older_than : float, optional
+        only workspaces not modified for this many seconds are removed,
+        so that running jobs are never affected, by default 86400
+    """
+    root = cache_path / WORKSPACES_DIR
+    if not root.exists():
+        return
+
+    for workspace in root.iterdir():
+        if time.time() - workspace.stat().st_mtime > older_than:
+            logger.info(f"Removing stale workspace: {workspace}")
+            shutil.rmtree(workspace, ignore_errors=True)
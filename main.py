@@ -1,18 +1,109 @@
 import argparse
 import logging
-import os
+import shlex
+import sys
+from contextlib import nullcontext
 from logging import getLogger
 from pathlib import Path
 
 from config import (
     ARXIV_CATEGORIES,
+    BACKFILL_CHECKPOINT_PATH,
     CACHE_PATH,
     CANDIDATE_LABELS,
+    DATA_PATH,
     DATABASE_ID,
+    ENGRAFO_COMMAND,
+    ENGRAFO_CONTAINERS,
+    ENGRAFO_TIMEOUT,
+    FIGURE_DPI,
+    FIGURE_MAX_SIZE,
+    FIGURE_WORKERS,
     GYAZO_ACCESS_TOKEN,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_POOL_MAXSIZE,
+    HTTP_READ_TIMEOUT,
+    LABEL_PREFILTER_TOP_K,
+    METRICS_MAX_MB,
+    METRICS_PATH,
+    MODEL_IDLE_TIMEOUT,
+    MODEL_MEMORY_BUDGET_MB,
     NOTION_ACCESS_TOKEN,
+    NOTION_CONVERTER,
+    PAGE_CACHE_MAX_MB,
+    PAGE_CACHE_TTL,
+    PIPELINE_CLASSIFY_CONCURRENCY,
+    PIPELINE_EXTRACT_CONCURRENCY,
+    PIPELINE_FETCH_CONCURRENCY,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_UPLOAD_CONCURRENCY,
+)
+from lib import (
+    READING_LIST_FORMATS,
+    DockerEngrafoRunner,
+    LocalEngrafoRunner,
+    archive_url,
+    archive_urls,
+    backfill,
+    configure_http,
+    engrafo_renderer,
+    figure_rasterizer,
+    metrics,
+    model_registry,
+    read_urls,
+)
+
+model_registry.configure(
+    memory_budget_mb=MODEL_MEMORY_BUDGET_MB,
+    idle_timeout=MODEL_IDLE_TIMEOUT,
+)
+configure_http(
+    connect_timeout=HTTP_CONNECT_TIMEOUT,
+    read_timeout=HTTP_READ_TIMEOUT,
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+)
+figure_rasterizer.configure(
+    dpi=FIGURE_DPI,
+    max_size=FIGURE_MAX_SIZE,
+    max_workers=FIGURE_WORKERS,
+    cache_path=DATA_PATH / "figures",
+)
+engrafo_renderer.configure(
+    runners=(
+        [LocalEngrafoRunner(shlex.split(ENGRAFO_COMMAND))]
+        if ENGRAFO_COMMAND
+        # the cache directory is mounted at /app/output in the engrafo containers
+        else [DockerEngrafoRunner(name, CACHE_PATH) for name in ENGRAFO_CONTAINERS]
+    ),
+    timeout=ENGRAFO_TIMEOUT,
+    cache_path=DATA_PATH / "engrafo",
+)
+metrics.configure(path=METRICS_PATH, max_mb=METRICS_MAX_MB)
+
+PIPELINE_KWARGS = dict(
+    cache_path=CACHE_PATH,
+    arxiv_categories=ARXIV_CATEGORIES,
+    candidate_labels=CANDIDATE_LABELS,
+    notion_access_token=NOTION_ACCESS_TOKEN,
+    gyazo_access_token=GYAZO_ACCESS_TOKEN,
+    database_id=DATABASE_ID,
+    threshold=0.9,
+    prefilter_top_k=LABEL_PREFILTER_TOP_K,
+    data_path=DATA_PATH,
+    notion_converter=NOTION_CONVERTER,
+    page_cache_max_mb=PAGE_CACHE_MAX_MB,
+    page_cache_ttl=PAGE_CACHE_TTL,
+)
+# stages which several URLs go through at the same time, see lib/pipeline.py
+STAGE_KWARGS = dict(
+    concurrency={
+        "fetch": PIPELINE_FETCH_CONCURRENCY,
+        "extract": PIPELINE_EXTRACT_CONCURRENCY,
+        "classify": PIPELINE_CLASSIFY_CONCURRENCY,
+        "upload": PIPELINE_UPLOAD_CONCURRENCY,
+    },
+    queue_size=PIPELINE_QUEUE_SIZE,
 )
-from lib import get_web_content, label_text, post_to_notion
 
 
 def main():
@@ -24,51 +115,52 @@ def main():
     logger.debug("Starting main function...")
 
     argparser = argparse.ArgumentParser()
-    argparser.add_argument("url", help="URL to upload", type=str)
-    args = argparser.parse_args()
-
-    logger.debug(f"Fetching content from: {args.url}")
-
-    processed_content = get_web_content(
-        url=args.url,
-        cache_path=CACHE_PATH,
-        arxiv_categories=ARXIV_CATEGORIES,
+    argparser.add_argument("url", help="URL to upload", type=str, nargs="?")
+    argparser.add_argument(
+        "--worker",
+        help="keep running and archive URLs read line by line from stdin",
+        action="store_true",
     )
+    argparser.add_argument(
+        "--backfill",
+        help="archive the URLs of a reading list, '-' for stdin",
+        metavar="FILE",
+    )
+    argparser.add_argument(
+        "--format",
+        help="format of the reading list, by default guessed from its first line",
+        choices=READING_LIST_FORMATS,
+        default="auto",
+    )
+    argparser.add_argument(
+        "--checkpoint",
+        help="file recording the URLs archived by --backfill, skipped when resumed",
+        type=Path,
+        default=BACKFILL_CHECKPOINT_PATH,
+    )
+    args = argparser.parse_args()
 
-    logger.debug(f"Fetching content: Done!")
-    logger.debug("Labeling content using mDeBERTa-v3...")
-
-    if processed_content.tags is None:
-        tags = label_text(
-            text=processed_content.cleansed_content,
-            candidate_labels=CANDIDATE_LABELS,
-            threshold=0.9,
-        )
-        processed_content.tags = tags
-
-    logger.debug("Labeling content using mDeBERTa-v3: Done!")
-    logger.debug("Uploading content to Notion...")
+    if args.backfill is not None:
+        with (
+            open(args.backfill, encoding="utf-8", newline="")
+            if args.backfill != "-"
+            else nullcontext(sys.stdin)
+        ) as f:
+            urls = list(read_urls(f, format=args.format))
 
-    post_to_notion(
-        notion_access_token=NOTION_ACCESS_TOKEN,
-        gyazo_access_token=GYAZO_ACCESS_TOKEN,
-        database_id=DATABASE_ID,
-        processed_content=processed_content,
-    )
+        summary = backfill(urls, args.checkpoint, **STAGE_KWARGS, **PIPELINE_KWARGS)
+        print(summary)
+        if summary.failed or summary.interrupted:
+            sys.exit(1)
+    elif args.worker:
+        archive_urls(sys.stdin, **STAGE_KWARGS, **PIPELINE_KWARGS)
+    elif args.url is not None:
+        archive_url(args.url, **PIPELINE_KWARGS)
+    else:
+        argparser.error("either url, --worker or --backfill is required")
 
     logger.debug("Main function: Done!")
 
-    # remove all cache and directories without log and directories
-    for root, dirs, files in os.walk(CACHE_PATH):
-        for file in files:
-            path = Path(os.path.join(root, file))
-            if not path.name.endswith(".log"):
-                os.remove(path)
-    for root, dirs, files in os.walk(CACHE_PATH):
-        for dir in dirs:
-            path = Path(os.path.join(root, dir))
-            os.rmdir(path)
-
 
 if __name__ == "__main__":
     main()
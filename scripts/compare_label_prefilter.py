@@ -0,0 +1,37 @@
+"""Report how well the embedding prefilter agrees with the full NLI labeling.
+
+Usage:
+    python scripts/compare_label_prefilter.py texts.txt --top-k 5 10 15
+
+`texts.txt` contains one cleansed text per line.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from config import CANDIDATE_LABELS  # noqa: E402
+from lib import compare_prefilter  # noqa: E402
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("texts", help="file with one text per line", type=Path)
+    argparser.add_argument("--top-k", type=int, nargs="+", default=[5, 10, 15])
+    argparser.add_argument("--threshold", type=float, default=0.9)
+    args = argparser.parse_args()
+
+    texts = [
+        line.strip() for line in args.texts.read_text().splitlines() if line.strip()
+    ]
+    for top_k in args.top_k:
+        report = compare_prefilter(
+            texts, CANDIDATE_LABELS, top_k=top_k, threshold=args.threshold
+        )
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
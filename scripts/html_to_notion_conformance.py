@@ -0,0 +1,115 @@
+"""Compare the native HTML->Notion converter with the markdownify + martian path.
+
+Usage:
+    python scripts/html_to_notion_conformance.py [corpus_dir] [--update] [--strict]
+
+Each `<name>.html` in the corpus (readability output or engrafo HTML) is
+converted by `lib.html_to_notion`. The expected blocks are read from
+`<name>.martian.json`, or computed with martian through the Node sidecar
+when that file does not exist. `--update` (re)writes the expected files.
+
+For each page, the sequence of (block type, plain text) pairs is compared,
+which is what ends up visible in Notion. Line breaks inside a block other
+than code are not compared, since martian drops hard breaks (<br>) which
+the native converter keeps. `--strict` also requires the block dicts to be
+identical. The exit code is 1 if any page does not conform.
+"""
+import argparse
+import difflib
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from lib import html_to_markdown, html_to_notion  # noqa: E402
+from lib.node_sidecar import markdown_to_notion  # noqa: E402
+
+
+def martian_blocks(html: str) -> list:
+    with tempfile.TemporaryDirectory() as tmp:
+        return markdown_to_notion(html_to_markdown(html), Path(tmp))
+
+
+def strip_object_keys(value):
+    if isinstance(value, dict):
+        return {k: strip_object_keys(v) for k, v in value.items() if k != "object"}
+    if isinstance(value, list):
+        return [strip_object_keys(v) for v in value]
+    return value
+
+
+def signature(blocks: list, depth: int = 0) -> list[str]:
+    lines = []
+    for block in blocks:
+        body = block[block["type"]]
+        text = "".join(
+            item.get("text", {}).get("content", "")
+            for item in body.get("rich_text", [])
+        )
+        if block["type"] == "image":
+            text = body["external"]["url"]
+        elif block["type"] != "code":
+            text = text.replace("\n", "")
+        lines.append(f"{'  ' * depth}{block['type']}: {' '.join(text.split())}")
+        if block["type"] != "table":
+            lines.extend(signature(body.get("children", []), depth + 1))
+    return lines
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument(
+        "corpus",
+        nargs="?",
+        type=Path,
+        default=Path(__file__).resolve().parents[1] / "fixtures" / "pages",
+    )
+    argparser.add_argument("--update", action="store_true")
+    argparser.add_argument("--strict", action="store_true")
+    args = argparser.parse_args()
+
+    failed = 0
+    pages = sorted(args.corpus.glob("*.html"))
+    for page in pages:
+        html = page.read_text()
+        expected_path = page.with_suffix(".martian.json")
+
+        if args.update or not expected_path.exists():
+            expected = martian_blocks(html)
+            if args.update:
+                expected_path.write_text(
+                    json.dumps(expected, ensure_ascii=False, indent=1)
+                )
+        else:
+            expected = json.loads(expected_path.read_text())
+
+        actual = list(html_to_notion(html))
+
+        expected_signature, actual_signature = signature(expected), signature(actual)
+        ok = expected_signature == actual_signature
+        if args.strict:
+            ok = ok and strip_object_keys(expected) == strip_object_keys(actual)
+
+        ratio = difflib.SequenceMatcher(
+            None, expected_signature, actual_signature
+        ).ratio()
+        print(
+            f"{'PASS' if ok else 'FAIL'} {page.name}: "
+            f"{len(actual)} blocks, similarity {ratio:.2f}"
+        )
+        if not ok:
+            failed += 1
+            diff = difflib.unified_diff(
+                expected_signature, actual_signature, "martian", "native", lineterm=""
+            )
+            for line in list(diff)[:40]:
+                print(f"    {line}")
+
+    print(f"{len(pages) - failed}/{len(pages)} pages conform")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()